@@ -0,0 +1,84 @@
+import threading
+from typing import Dict, Optional
+
+
+class RttEstimator:
+    """
+    Smoothed round-trip-time estimate for a single host.
+
+    Uses the TCP retransmission timer algorithm (RFC 6298):
+        RTTVAR = (1 - beta) * RTTVAR + beta * |SRTT - R|
+        SRTT   = (1 - alpha) * SRTT + alpha * R
+        RTO    = SRTT + K * RTTVAR
+    """
+
+    ALPHA = 0.125
+    BETA = 0.25
+    K = 4
+
+    def __init__(self):
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.samples = 0
+
+    def update(self, rtt: float) -> None:
+        """Add one RTT measurement in seconds."""
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+        self.samples += 1
+
+    def rto(self) -> Optional[float]:
+        """Return the retransmission-style timeout, or None before the first sample."""
+        if self.srtt is None:
+            return None
+        return self.srtt + self.K * self.rttvar
+
+
+class AdaptiveTimeout:
+    """
+    Per-host connect timeouts derived from measured RTT.
+
+    Every open or closed reply is a real round trip, so its response_time
+    feeds that host's RttEstimator. Filtered and error results carry no RTT
+    information and are ignored. Until a host has produced a reply its
+    probes use the initial timeout.
+
+    Safe to share between the threads of a scan engine.
+
+    Args:
+        initial (float): Timeout used before a host has any RTT samples
+        floor (float): Smallest timeout ever returned
+        ceiling (float): Largest timeout ever returned
+    """
+
+    def __init__(self, initial: float = 2.0, floor: float = 0.05, ceiling: float = 2.0):
+        if floor > ceiling:
+            raise ValueError("Minimum timeout cannot exceed maximum timeout")
+        self.initial = initial
+        self.floor = floor
+        self.ceiling = ceiling
+        self._hosts: Dict[str, RttEstimator] = {}
+        self._lock = threading.Lock()
+
+    def timeout_for(self, host: str) -> float:
+        """Return the connect timeout to use for the next probe to host."""
+        with self._lock:
+            estimator = self._hosts.get(host)
+            rto = estimator.rto() if estimator is not None else None
+        if rto is None:
+            return self.initial
+        return min(self.ceiling, max(self.floor, rto))
+
+    def observe(self, host: str, result: Dict[str, any]) -> None:
+        """Feed a scan result into the host's RTT estimate."""
+        if result['status'] not in ('open', 'closed'):
+            return
+        with self._lock:
+            estimator = self._hosts.get(host)
+            if estimator is None:
+                estimator = self._hosts[host] = RttEstimator()
+            estimator.update(result['response_time'])
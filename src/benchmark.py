@@ -0,0 +1,375 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import selectors
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from typing import Dict, List, Optional, Tuple
+
+ENGINES = ('thread', 'async', 'scheduler', 'scheduler-async', 'sharded')
+
+# Engines run only when named with --engines: syn needs root or CAP_NET_RAW
+OPTIONAL_ENGINES = ('syn',)
+
+# Modules the CLI loads only when a feature needs them; importing portspy
+# must not pull any of them in
+LAZY_MODULES = ('asyncio', 'tqdm', 'colorama', 'http.server', 'multiprocessing', 'sqlite3')
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import portspy
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'loaded': [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+class FakeNetwork:
+    """
+    Loopback listeners that behave like open, closed and filtered ports.
+
+    - open: a listening socket; a background thread accepts and closes
+      every connection so the accept queue never fills up
+    - closed: a bound socket that is not listening, so the kernel answers
+      connects with RST (and the port number stays reserved)
+    - filtered: a listening socket with a backlog of 0 that is never
+      accepted from, pre-filled with connections; further SYNs are dropped
+      and connects time out, as they do behind a dropping firewall
+
+    Use as a context manager; expected maps each port to its status.
+    """
+
+    def __init__(self, open_ports: int = 200, closed_ports: int = 200,
+                 filtered_ports: int = 10, host: str = "127.0.0.1"):
+        self.host = host
+        self.counts = {'open': open_ports, 'closed': closed_ports, 'filtered': filtered_ports}
+        self.expected: Dict[int, str] = {}
+        self._sockets: List[socket.socket] = []
+        self._selector = selectors.DefaultSelector()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _bind(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind((self.host, 0))
+        self._sockets.append(sock)
+        return sock
+
+    def start(self) -> "FakeNetwork":
+        for _ in range(self.counts['open']):
+            sock = self._bind()
+            sock.listen(1024)
+            sock.setblocking(False)
+            self._selector.register(sock, selectors.EVENT_READ)
+            self.expected[sock.getsockname()[1]] = 'open'
+
+        for _ in range(self.counts['closed']):
+            self.expected[self._bind().getsockname()[1]] = 'closed'
+
+        for _ in range(self.counts['filtered']):
+            sock = self._bind()
+            sock.listen(0)
+            port = sock.getsockname()[1]
+            for _ in range(3):
+                filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                filler.setblocking(False)
+                filler.connect_ex((self.host, port))
+                self._sockets.append(filler)
+            self.expected[port] = 'filtered'
+        # Let the handshakes that fill the filtered backlogs complete
+        time.sleep(0.2)
+
+        self._thread = threading.Thread(target=self._accept_loop, name="fake-network", daemon=True)
+        self._thread.start()
+        return self
+
+    def _accept_loop(self) -> None:
+        while not self._stopping:
+            for key, _ in self._selector.select(timeout=0.1):
+                try:
+                    conn, _ = key.fileobj.accept()
+                    conn.close()
+                except OSError:
+                    pass
+
+    def close(self) -> None:
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join()
+        self._selector.close()
+        for sock in self._sockets:
+            sock.close()
+
+    def __enter__(self) -> "FakeNetwork":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def _peak_rss_kib(usage) -> int:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return usage.ru_maxrss // 1024 if sys.platform == "darwin" else usage.ru_maxrss
+
+
+def _usage() -> Tuple[float, Optional[int]]:
+    """CPU seconds used by this process and its children so far, and peak RSS in KiB (None if unknown)."""
+    try:
+        import resource
+    except ImportError:  # Windows has no getrusage: own CPU time only
+        return time.process_time(), None
+    usage_self = resource.getrusage(resource.RUSAGE_SELF)
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_seconds = (usage_self.ru_utime + usage_self.ru_stime
+                   + usage_children.ru_utime + usage_children.ru_stime)
+    return cpu_seconds, max(_peak_rss_kib(usage_self), _peak_rss_kib(usage_children))
+
+
+def _run_case(engine: str, host: str, ports: List[int], expected: Dict[int, str],
+              timeout: float, concurrency: int) -> Dict[str, any]:
+    """Scan the fake network once; runs in a fresh process so RSS and CPU are per case."""
+    import tcp_scanner
+    from scheduler import scan_targets, scan_targets_async
+    from sharding import scan_targets_sharded
+
+    # Time every probe precisely (results only carry millisecond response times)
+    latencies: List[float] = []
+    scan_port, scan_port_async = tcp_scanner.tcp_scan_port, tcp_scanner.tcp_scan_port_async
+
+    def timed_scan_port(ip, port, timeout=2.0):
+        start = time.perf_counter()
+        result = scan_port(ip, port, timeout)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    async def timed_scan_port_async(ip, port, timeout=2.0):
+        start = time.perf_counter()
+        result = await scan_port_async(ip, port, timeout)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    tcp_scanner.tcp_scan_port = timed_scan_port
+    tcp_scanner.tcp_scan_port_async = timed_scan_port_async
+
+    cpu_before, _ = _usage()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if engine == 'thread':
+            results = tcp_scanner.tcp_scan_ports(host, ports, timeout, max_threads=concurrency,
+                                                 show_progress=False)
+        elif engine == 'async':
+            results = asyncio.run(tcp_scanner.tcp_scan_ports_async(
+                host, ports, timeout, max_concurrency=concurrency, show_progress=False))
+        elif engine == 'scheduler':
+            results = scan_targets([host], ports, timeout, max_threads=concurrency,
+                                   show_progress=False, quiet=True)[host]
+        elif engine == 'scheduler-async':
+            results = asyncio.run(scan_targets_async(
+                [host], ports, timeout, max_concurrency=concurrency, show_progress=False,
+                quiet=True))[host]
+        elif engine == 'sharded':
+            results = scan_targets_sharded([host], ports, workers=2, timeout=timeout,
+                                           concurrency=concurrency, engine='async',
+                                           show_progress=False)[host]
+        elif engine == 'syn':
+            from scanner import Scanner
+            results = Scanner(ports, timeout, 'syn', concurrency).run([host])[host]
+        else:
+            raise ValueError(f"Unknown engine: {engine}")
+    seconds = time.perf_counter() - start
+    cpu_after, peak_rss_kib = _usage()
+
+    counts: Dict[str, int] = {}
+    mismatches = 0
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+        if expected.get(result['port']) != result['status']:
+            mismatches += 1
+    if not latencies:
+        # Sharded probes run in worker processes and SYN probes bypass the connect
+        # functions; fall back to their response times
+        latencies = [result['response_time'] for result in results]
+
+    cpu_seconds = cpu_after - cpu_before
+    probes = len(ports)
+    p50, p99 = _percentile(latencies, 0.50), _percentile(latencies, 0.99)
+    return {
+        'engine': engine,
+        'concurrency': concurrency,
+        'timeout': timeout,
+        'probes': probes,
+        'counts': counts,
+        'mismatches': mismatches,
+        'seconds': round(seconds, 4),
+        'probes_per_second': round(probes / seconds, 1) if seconds else None,
+        'latency_p50_ms': round(p50 * 1000, 3) if p50 is not None else None,
+        'latency_p99_ms': round(p99 * 1000, 3) if p99 is not None else None,
+        'peak_rss_kib': peak_rss_kib,
+        'cpu_seconds': round(cpu_seconds, 4),
+        'cpu_us_per_probe': round(cpu_seconds / probes * 1e6, 2) if probes else None,
+    }
+
+
+def run_benchmarks(engines: List[str], concurrency_levels: List[int], timeouts: List[float],
+                   open_ports: int = 200, closed_ports: int = 200, filtered_ports: int = 10,
+                   repeat: int = 1) -> Dict[str, any]:
+    """
+    Run every engine x concurrency x timeout combination against a FakeNetwork.
+
+    Each run happens in a freshly spawned process, so peak RSS and CPU
+    time belong to that run alone.
+
+    Returns:
+        Dict: Environment details and one entry per run under "runs"
+    """
+    runs = []
+    with FakeNetwork(open_ports, closed_ports, filtered_ports) as network:
+        ports = sorted(network.expected)
+        for engine in engines:
+            for concurrency in concurrency_levels:
+                for timeout in timeouts:
+                    for _ in range(repeat):
+                        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                            run = executor.submit(_run_case, engine, network.host, ports,
+                                                  network.expected, timeout, concurrency).result()
+                        runs.append(run)
+                        print(f"{engine:<16} c={concurrency:<5} timeout={timeout:<5} "
+                              f"{run['probes_per_second']:>9} probes/s  "
+                              f"p50={run['latency_p50_ms']}ms p99={run['latency_p99_ms']}ms  "
+                              f"rss={run['peak_rss_kib'] or '?'}KiB cpu/probe={run['cpu_us_per_probe']}us"
+                              + (f"  MISMATCHES={run['mismatches']}" if run['mismatches'] else ""),
+                              file=sys.stderr)
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'network': network.counts,
+        'runs': runs,
+    }
+
+
+def measure_startup(repeat: int = 10) -> Dict[str, any]:
+    """
+    Time importing the CLI and running portspy.py --help, each in fresh interpreters.
+
+    Medians over repeat runs are reported in milliseconds, next to the
+    bare interpreter startup for reference. "eager_imports" lists modules
+    from LAZY_MODULES that importing portspy loaded.
+    """
+    src = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, NO_COLOR="1")
+    imports, helps, bare = [], [], []
+    eager = set()
+    for _ in range(repeat):
+        probe = subprocess.run([sys.executable, "-c", _IMPORT_PROBE], cwd=src, env=env,
+                               capture_output=True, text=True, check=True)
+        report = json.loads(probe.stdout)
+        imports.append(report['seconds'])
+        eager.update(report['loaded'])
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        bare.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(src, "portspy.py"), "--help"], env=env,
+                       stdout=subprocess.DEVNULL, check=True)
+        helps.append(time.perf_counter() - start)
+
+    return {
+        'repeat': repeat,
+        'import_ms': round(statistics.median(imports) * 1000, 2),
+        'help_ms': round(statistics.median(helps) * 1000, 2),
+        'interpreter_ms': round(statistics.median(bare) * 1000, 2),
+        'eager_imports': sorted(eager),
+    }
+
+
+def _number_list(value: str, kind):
+    return [kind(part) for part in value.split(",") if part.strip()]
+
+
+def _write_report(report: Dict[str, any], path: Optional[str]) -> None:
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the PortSpy scan engines against local fake listeners. "
+                    "Results are written as JSON; progress goes to stderr."
+    )
+    parser.add_argument('--engines', default=",".join(ENGINES),
+                        help=f'Comma-separated engines to run (default: {",".join(ENGINES)}; '
+                             f'also: {",".join(OPTIONAL_ENGINES)})')
+    parser.add_argument('--concurrency', default="50,200",
+                        help='Comma-separated thread/connect limits (default: 50,200)')
+    parser.add_argument('--timeouts', default="0.25,1.0",
+                        help='Comma-separated connect timeouts in seconds (default: 0.25,1.0)')
+    parser.add_argument('--open', type=int, default=200, help='Open ports (default: 200)')
+    parser.add_argument('--closed', type=int, default=200, help='Closed ports (default: 200)')
+    parser.add_argument('--filtered', type=int, default=10, help='Filtered ports (default: 10)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per combination (default: 1)')
+    parser.add_argument('--label', help='Free-form label stored with the results, e.g. a release tag')
+    parser.add_argument('-o', '--output', metavar='FILE', help='Write JSON here instead of stdout')
+    parser.add_argument('--startup', action='store_true',
+                        help='Measure CLI import and --help time instead of scan engines')
+    parser.add_argument('--startup-budget-ms', type=float,
+                        help='With --startup, fail if importing portspy takes longer than this (median)')
+    args = parser.parse_args()
+
+    if args.startup:
+        report = measure_startup(max(args.repeat, 10))
+        print(f"import portspy: {report['import_ms']}ms  portspy.py --help: {report['help_ms']}ms  "
+              f"(bare interpreter: {report['interpreter_ms']}ms)", file=sys.stderr)
+        failed = bool(report['eager_imports'])
+        if failed:
+            print(f"Importing portspy loaded: {', '.join(report['eager_imports'])}", file=sys.stderr)
+        if args.startup_budget_ms is not None and report['import_ms'] > args.startup_budget_ms:
+            print(f"Import time over budget of {args.startup_budget_ms}ms", file=sys.stderr)
+            failed = True
+        if args.label:
+            report['label'] = args.label
+        _write_report(report, args.output)
+        return 1 if failed else 0
+
+    engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+    unknown = set(engines) - set(ENGINES) - set(OPTIONAL_ENGINES)
+    if unknown:
+        parser.error(f"unknown engine(s): {', '.join(sorted(unknown))}")
+
+    report = run_benchmarks(engines, _number_list(args.concurrency, int), _number_list(args.timeouts, float),
+                            args.open, args.closed, args.filtered, args.repeat)
+    if args.label:
+        report['label'] = args.label
+
+    _write_report(report, args.output)
+    return 1 if any(run['mismatches'] for run in report['runs']) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
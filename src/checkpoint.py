@@ -0,0 +1,134 @@
+import ipaddress
+import json
+import os
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from results import HostResults, PortIndex
+
+# File layout:
+#   magic | header length (4 bytes) | JSON header {"ports": [[start, end], ...]}
+#   then per host: address length (1) | packed address | data length (4) | zlib(status bytes)
+# The status bytes are HostResults.statuses: one byte per scanned port, 0 = not done.
+CHECKPOINT_MAGIC = b"PSPYCKP1"
+_LENGTH = struct.Struct("!I")
+
+
+def _port_ranges(ports: List[int]) -> List[List[int]]:
+    """Compress a port list into ascending [start, end] runs."""
+    ranges = []
+    for port in sorted(ports):
+        if ranges and port == ranges[-1][1] + 1:
+            ranges[-1][1] = port
+        else:
+            ranges.append([port, port])
+    return ranges
+
+
+class Checkpoint:
+    """
+    Periodically saves which (host, port) probes have completed.
+
+    The scan engine calls attach() with its live results and maybe_save()
+    after every result. Writes are atomic (temporary file + rename), so an
+    interrupted save never corrupts the previous checkpoint.
+
+    Args:
+        path (str): Checkpoint file to write
+        ports (List[int]): The scan's port list (any order)
+        interval (float): Seconds between automatic saves
+    """
+
+    def __init__(self, path: str, ports: List[int], interval: float = 30.0):
+        self.path = path
+        self.ports = ports
+        self.interval = interval
+        self.results_by_host: Optional[Dict[str, HostResults]] = None
+        self._last_save = time.monotonic()
+        self._calls = 0
+
+    def attach(self, results_by_host: Dict[str, HostResults]) -> None:
+        """Point the checkpoint at the engine's live per-host results."""
+        self.results_by_host = results_by_host
+
+    def maybe_save(self) -> None:
+        """Save if the interval has passed; cheap enough to call per result."""
+        self._calls += 1
+        if self._calls % 256:
+            return
+        if time.monotonic() - self._last_save >= self.interval:
+            self.save()
+
+    def save(self) -> None:
+        """Write the current state to disk atomically."""
+        if self.results_by_host is None:
+            return
+
+        header = json.dumps({'ports': _port_ranges(self.ports)}).encode("utf-8")
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "wb") as handle:
+            handle.write(CHECKPOINT_MAGIC)
+            handle.write(_LENGTH.pack(len(header)))
+            handle.write(header)
+            for host, results in list(self.results_by_host.items()):
+                address = ipaddress.ip_address(host).packed
+                data = zlib.compress(bytes(results.statuses))
+                handle.write(bytes((len(address),)) + address)
+                handle.write(_LENGTH.pack(len(data)))
+                handle.write(data)
+        os.replace(temp_path, self.path)
+        self._last_save = time.monotonic()
+
+
+class ResumeState:
+    """
+    Completed probes loaded from a checkpoint file.
+
+    Raises:
+        ValueError: If the file is not a checkpoint or was written for a
+            different port list
+    """
+
+    def __init__(self, path: str, ports: List[int]):
+        self.statuses: Dict[str, bytes] = {}
+
+        with open(path, "rb") as handle:
+            if handle.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+                raise ValueError(f"{path} is not a PortSpy checkpoint")
+            (header_length,) = _LENGTH.unpack(handle.read(_LENGTH.size))
+            header = json.loads(handle.read(header_length))
+            if header['ports'] != _port_ranges(ports):
+                raise ValueError(f"{path} was written for a different port list")
+
+            while True:
+                length = handle.read(1)
+                if not length:
+                    break
+                host = str(ipaddress.ip_address(handle.read(length[0])))
+                (data_length,) = _LENGTH.unpack(handle.read(_LENGTH.size))
+                self.statuses[host] = zlib.decompress(handle.read(data_length))
+
+        self._index = PortIndex(ports)
+        self.ports = self._index.ports
+
+    def is_done(self, host: str, port: int) -> bool:
+        statuses = self.statuses.get(host)
+        if statuses is None:
+            return False
+        return statuses[self._index.positions[port]] != 0
+
+    def remaining(self, host: str) -> Optional[List[int]]:
+        """Ports still to scan on host, or None if the host was never started."""
+        statuses = self.statuses.get(host)
+        if statuses is None:
+            return None
+        return [port for port, code in zip(self.ports, statuses) if not code]
+
+    def restore(self, index: PortIndex, keep_closed: bool) -> Dict[str, HostResults]:
+        """Rebuild HostResults for every host in the checkpoint."""
+        return {
+            host: HostResults.from_statuses(index, statuses, keep_closed)
+            for host, statuses in self.statuses.items()
+        }
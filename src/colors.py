@@ -0,0 +1,68 @@
+import os
+import sys
+from typing import Optional
+
+# None until first used: then decided from NO_COLOR and whether stdout is a terminal
+_enabled: Optional[bool] = None
+_colorama = None
+
+
+def color_enabled() -> bool:
+    """
+    Return whether output is colored.
+
+    Color is off when set_color(False) was called (--no-color), when the
+    NO_COLOR environment variable is set, or when stdout is not a
+    terminal; colorama would strip the codes from piped output anyway.
+    """
+    global _enabled
+    if _enabled is None:
+        _enabled = not os.environ.get("NO_COLOR") and sys.stdout.isatty()
+    return _enabled
+
+
+def set_color(enabled: bool) -> None:
+    """Force color on or off, e.g. from --no-color, before anything is printed."""
+    global _enabled
+    _enabled = enabled
+    for palette in (Fore, Back, Style):
+        palette._reset()
+
+
+def _load_colorama():
+    """Import colorama and wrap stdout for it, once."""
+    global _colorama
+    if _colorama is None:
+        import colorama
+        colorama.init(autoreset=True)
+        _colorama = colorama
+    return _colorama
+
+
+class _Palette:
+    """
+    Stands in for colorama's Fore, Back or Style.
+
+    colorama is only imported the first time a color is read while color
+    is enabled; with color off every attribute is an empty string. Values
+    are cached on the instance after the first lookup.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr: str) -> str:
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        value = getattr(getattr(_load_colorama(), self._name), attr) if color_enabled() else ""
+        setattr(self, attr, value)
+        return value
+
+    def _reset(self) -> None:
+        for attr in [attr for attr in vars(self) if not attr.startswith("_")]:
+            delattr(self, attr)
+
+
+Fore = _Palette("Fore")
+Back = _Palette("Back")
+Style = _Palette("Style")
@@ -0,0 +1,154 @@
+import threading
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from adaptive_timeout import AdaptiveTimeout
+from rate_control import RateController
+from resource_governor import ResourceGovernor
+from scanner import Scanner
+from scheduler import HostFeed
+
+# Ports most likely to answer on a live host, open or with a reset: web,
+# SSH, SMB and RDP between them cover most servers and workstations
+DISCOVERY_PORTS = (80, 443, 22, 445, 3389)
+
+
+class _PaceOnly:
+    """
+    Paces discovery probes with the scan's RateController without feeding its AIMD.
+
+    Most probes of a sparse range time out, which the controller would
+    take for packet loss and answer by halving the rate of the scan.
+    Sharing its send slots keeps discovery and scan together within it.
+    """
+
+    def __init__(self, controller: RateController):
+        self.controller = controller
+
+    @property
+    def rate(self) -> float:
+        return self.controller.rate
+
+    def acquire(self) -> None:
+        self.controller.acquire()
+
+    async def acquire_async(self) -> None:
+        await self.controller.acquire_async()
+
+    def record(self, status: str) -> None:
+        pass
+
+
+def split_concurrency(concurrency: int) -> Tuple[int, int]:
+    """
+    Split one thread or connect budget between discovery and the scan it feeds.
+
+    Both run at the same time, so together they stay within the budget
+    (and within a ResourceGovernor's socket budget it was capped to).
+
+    Returns:
+        (discovery, scan) concurrency, each at least 1
+    """
+    discovery = max(1, concurrency // 2)
+    return discovery, max(1, concurrency - discovery)
+
+
+def discover_hosts(hosts: Iterable[str], ports: Tuple[int, ...] = DISCOVERY_PORTS,
+                   timeout: float = 0.5, engine: str = 'thread',
+                   concurrency: Optional[int] = None,
+                   timeout_policy: Optional[AdaptiveTimeout] = None,
+                   rate: Optional[RateController] = None,
+                   governor: Optional[ResourceGovernor] = None,
+                   on_down: Optional[Callable[[str], None]] = None,
+                   on_finish: Optional[Callable[[int], None]] = None) -> HostFeed:
+    """
+    Start finding the hosts that answer on any of a few ports; return them as they answer.
+
+    Every host gets a short-timeout probe on each of ports with the
+    selected engine. An open port or a reset (closed) proves the host is
+    up; a host whose probes all time out or are unreachable is dropped,
+    so a sweep of a sparse network does not wait out the full timeout on
+    every port of every missing address. A live host that firewalls all
+    of ports is dropped as well.
+
+    The sweep runs on its own thread and puts live hosts on the returned
+    HostFeed, which Scanner.scan takes hosts from as they arrive: the
+    scan starts on the first live hosts while the rest of the range is
+    still being probed. Only hosts with discovery probes still in flight
+    are tracked. Closing the feed stops the sweep. on_down and on_finish
+    are called on the discovery thread.
+
+    The replies are real round trips, so they are fed to timeout_policy:
+    the full scan of a live host then starts from its measured timeout
+    instead of the initial one.
+
+    Args:
+        hosts (Iterable[str]): Target IP addresses, possibly a generator;
+            consumed on the discovery thread
+        ports (Tuple[int, ...]): Ports probed on every host
+        timeout (float): Connect timeout per discovery probe
+        engine (str): "thread", "async" or "syn", as for Scanner
+        concurrency (int): As for Scanner; see split_concurrency when the
+            scan runs alongside
+        timeout_policy (AdaptiveTimeout): Optional per-host timeouts to seed
+        rate (RateController): Optional probes-per-second limit shared with
+            the scan; discovery probes take its send slots but their
+            timeouts are not counted as loss
+        governor (ResourceGovernor): Optional file descriptor budget
+        on_down (Callable): Called as on_down(host) for each dropped host
+        on_finish (Callable): Called as on_finish(live_count) when the sweep
+            is complete
+
+    Returns:
+        HostFeed: Hosts that answered, in the order they answered
+
+    Raises:
+        ValueError: If ports is empty; with nothing to probe no host could
+            answer
+    """
+    if not ports:
+        raise ValueError("Host discovery needs at least one port")
+    feed = HostFeed()
+    # Discovery probes still out per host, until the host answers or is dropped
+    pending: Dict[str, int] = {}
+
+    def track(hosts: Iterable[str]) -> Iterator[str]:
+        for host in hosts:
+            pending[host] = len(ports)
+            yield host
+
+    def sweep() -> None:
+        scanner = Scanner(list(ports), timeout, engine, concurrency, keep_closed=False,
+                          rate=_PaceOnly(rate) if rate is not None else None, governor=governor)
+        results = scanner.scan(track(hosts))
+        live = 0
+        try:
+            for host, result in results:
+                if feed.closed:
+                    return  # The scan is over
+                remaining = pending.get(host)
+                if remaining is None:
+                    continue  # Already known to be up
+                if result.status in ('open', 'closed'):
+                    del pending[host]
+                    if timeout_policy is not None:
+                        timeout_policy.observe(host, result)
+                    if not feed.put(host):
+                        return  # The scan is over
+                    live += 1
+                elif remaining > 1:
+                    pending[host] = remaining - 1
+                else:
+                    del pending[host]
+                    if on_down is not None:
+                        on_down(host)
+        except BaseException as exc:
+            feed.end(exc)
+            return
+        finally:
+            results.close()
+        feed.end()
+        if on_finish is not None:
+            on_finish(live)
+
+    threading.Thread(target=sweep, name="host-discovery", daemon=True).start()
+    return feed
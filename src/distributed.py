@@ -0,0 +1,437 @@
+import hmac
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from queue import Empty, SimpleQueue
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from checkpoint import ResumeState
+from results import ScanResult
+from scheduler import HostFeed, _ScanState
+from sharding import _RECORD, _scan_shard, make_shards, unpack_results
+from tcp_scanner import STATUS_CODES
+
+# Ports per lease: a lease covers a window of hosts and one stripe of ports,
+# with as many stripes as it takes to keep each stripe this short
+_PORTS_PER_LEASE = 1024
+
+# Header before each host's records in a results body: address length, records length
+_HOST_HEADER = struct.Struct("!BI")
+
+_TOKEN_HEADER = "X-PortSpy-Token"
+
+# Largest request body accepted; a full lease of results is well under 1 MiB
+_MAX_BODY = 16 * 1024 * 1024
+
+
+def pack_lease_results(results: Dict[str, bytes]) -> bytes:
+    """Pack a worker's {host: pack_results(...)} into one body for the coordinator."""
+    parts = []
+    for host, packed in results.items():
+        address = host.encode("ascii")
+        parts.append(_HOST_HEADER.pack(len(address), len(packed)))
+        parts.append(address)
+        parts.append(packed)
+    return b"".join(parts)
+
+
+def unpack_lease_results(data: bytes) -> Iterator[Tuple[str, bytes]]:
+    """
+    Split a body produced by pack_lease_results into (host, packed records).
+
+    Raises:
+        ValueError: If the body is truncated
+    """
+    offset = 0
+    while offset < len(data):
+        if offset + _HOST_HEADER.size > len(data):
+            raise ValueError("Truncated lease results")
+        address_length, records_length = _HOST_HEADER.unpack_from(data, offset)
+        offset += _HOST_HEADER.size
+        end = offset + address_length + records_length
+        if end > len(data):
+            raise ValueError("Truncated lease results")
+        yield data[offset:offset + address_length].decode("ascii"), data[offset + address_length:end]
+        offset = end
+
+
+def _check_lease_results(lease: "_Lease", reported: List[Tuple[str, bytes]]) -> None:
+    """
+    Check that reported only holds well-formed records for the lease's hosts and ports.
+
+    Raises:
+        ValueError: If a host or port was not leased, or a record is garbled
+    """
+    hosts = set(lease.hosts)
+    ports = set(lease.ports)
+    for host, packed in reported:
+        if host not in hosts:
+            raise ValueError(f"Host {host} is not part of lease {lease.id}")
+        if len(packed) % _RECORD.size:
+            raise ValueError("Truncated lease results")
+        for port, code, _ in _RECORD.iter_unpack(packed):
+            if port not in ports or code >= len(STATUS_CODES):
+                raise ValueError(f"Record for port {port} is not part of lease {lease.id}")
+
+
+class _Lease:
+    """A shard handed to a worker; given to another one if not renewed in time."""
+
+    __slots__ = ('id', 'hosts', 'ports', 'worker', 'deadline', 'issued')
+
+    def __init__(self, id: int, hosts: List[str], ports: List[int]):
+        self.id = id
+        self.hosts = hosts
+        self.ports = ports
+        self.worker = None
+        self.deadline = 0.0
+        self.issued = 0
+
+
+class Coordinator:
+    """
+    Hands out scan work to worker nodes over HTTP and collects their results.
+
+    The (host, port) space is cut into shards by make_shards (a window of
+    hosts and a stripe of ports each). Workers (see run_worker) take one
+    shard at a time as a lease, scan it with the regular engine and post
+    the packed results back. A lease not renewed within lease_timeout is
+    handed to the next worker that asks; whichever copy reports first is
+    recorded and later ones are dropped, so a stalled or dead worker only
+    delays its shard.
+
+    Shards are planned lazily, when a worker asks for one, so the host
+    generator is never materialized; a slow plan (e.g. DNS lookups)
+    does not hold up renewals and reports from other workers. The server starts listening when the
+    Coordinator is created; workers that connect before a scan starts are
+    told to wait.
+
+    Protocol (all POST; bodies JSON unless noted):
+        /lease           {"worker": name} -> 200 lease, 204 nothing to hand
+                         out yet, 410 scan finished
+        /renew/<id>      -> 200, or 410 if the lease is no longer needed
+        /results/<id>    body from pack_lease_results -> 200, or 400 if it
+                         holds records outside the lease
+
+    Bodies over 16 MiB are refused with 413, a bad Content-Length with 400.
+
+    Args:
+        port (int): Port to listen on (0 picks a free one; see .address)
+        host (str): Address to listen on; 127.0.0.1 unless workers run on
+            other machines
+        lease_timeout (float): Seconds without a renewal before a lease is
+            reassigned
+        token (str): Optional shared secret workers must send
+    """
+
+    def __init__(self, port: int, host: str = "127.0.0.1", lease_timeout: float = 60.0,
+                 token: Optional[str] = None):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.lease_timeout = lease_timeout
+        self.token = token
+        self.reassigned = 0
+        self._lock = threading.Lock()
+        self._shards: Optional[Iterator[Tuple[List[str], List[int]]]] = None
+        self._settings: Dict[str, Any] = {}
+        self._leases: Dict[int, _Lease] = {}
+        self._next_id = 0
+        self._planned_all = False
+        self._planning = 0
+        self._plan_lock = threading.Lock()
+        self._finished = False
+        self._results: SimpleQueue = SimpleQueue()
+        coordinator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if coordinator.token is not None and not hmac.compare_digest(
+                        (self.headers.get(_TOKEN_HEADER) or "").encode("utf-8"),
+                        coordinator.token.encode("utf-8")):
+                    self._reply(403)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self._reply(400)
+                    return
+                if length > _MAX_BODY:
+                    self._reply(413)
+                    return
+                body = self.rfile.read(length)
+                route, _, lease_id = self.path.strip("/").partition("/")
+                try:
+                    if route == "lease":
+                        worker = json.loads(body or b"{}").get("worker")
+                        self._reply(*coordinator._lease(worker or self.client_address[0]))
+                    elif route == "renew" and lease_id.isdigit():
+                        self._reply(coordinator._renew(int(lease_id)))
+                    elif route == "results" and lease_id.isdigit():
+                        self._reply(coordinator._complete(int(lease_id), body))
+                    else:
+                        self._reply(404)
+                except ValueError:
+                    self._reply(400)
+
+            def _reply(self, status: int, payload: Optional[Dict[str, Any]] = None):
+                body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, name="coordinator-http",
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        host, port = self.address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, shards: Iterator[Tuple[List[str], List[int]]], settings: Dict[str, Any]) -> None:
+        """
+        Begin handing out shards.
+
+        settings are the keyword arguments of sharding._scan_shard besides
+        hosts and ports (timeout, concurrency, engine, ...), sent with every
+        lease so all workers scan the same way.
+        """
+        with self._lock:
+            self._shards = shards
+            self._settings = settings
+            self._leases.clear()
+            self._planned_all = self._finished = False
+
+    def finish(self) -> None:
+        """Stop handing out work; workers asking for more are told the scan is over."""
+        with self._lock:
+            self._finished = True
+            self._leases.clear()
+        self._results.put(None)
+
+    def results(self) -> Iterator[Tuple[str, bytes]]:
+        """Yield (host, packed records) as workers report, until every shard is in."""
+        while True:
+            with self._lock:
+                if self._finished or (self._planned_all and not self._leases and not self._planning):
+                    break
+            try:
+                reported = self._results.get(timeout=0.5)
+            except Empty:
+                continue
+            if reported is not None:
+                yield from reported
+        # Drain results that arrived together with the last one
+        while True:
+            try:
+                reported = self._results.get_nowait()
+            except Empty:
+                return
+            if reported is not None:
+                yield from reported
+
+    def _lease(self, worker: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+        with self._lock:
+            if self._finished:
+                return (410, None)
+            if self._shards is None:
+                return (204, None)
+            lease = next((lease for lease in self._leases.values() if lease.deadline < time.monotonic()),
+                         None)
+            if lease is not None:
+                self.reassigned += 1
+                return self._assign(lease, worker)
+            if self._planned_all:
+                return (204, None) if self._leases or self._planning else (410, None)
+            shards = self._shards
+            self._planning += 1
+        try:
+            # Planning pulls the target generator, DNS lookups included, so it runs
+            # outside self._lock and renewals and reports are not held up
+            with self._plan_lock:
+                shard = next(shards, None)
+                if isinstance(shard, HostFeed):
+                    return (204, None)  # No host queued yet; the worker asks again
+        finally:
+            with self._lock:
+                self._planning -= 1
+        with self._lock:
+            if self._finished or self._shards is not shards:
+                return (410, None)
+            if shard is None:
+                self._planned_all = True
+                return (204, None) if self._leases or self._planning else (410, None)
+            lease = self._leases[self._next_id] = _Lease(self._next_id, *shard)
+            self._next_id += 1
+            return self._assign(lease, worker)
+
+    def _assign(self, lease: _Lease, worker: str) -> Tuple[int, Dict[str, Any]]:
+        # Called with self._lock held
+        lease.worker = worker
+        lease.deadline = time.monotonic() + self.lease_timeout
+        lease.issued += 1
+        return (200, {
+            'lease': lease.id,
+            'hosts': lease.hosts,
+            'ports': lease.ports,
+            'settings': self._settings,
+            'renew_every': self.lease_timeout / 3,
+        })
+
+    def _renew(self, lease_id: int) -> int:
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None:
+                return 410
+            lease.deadline = time.monotonic() + self.lease_timeout
+            return 200
+
+    def _complete(self, lease_id: int, body: bytes) -> int:
+        # Parsed before taking the lease, so a garbled body leaves it to be reassigned
+        reported = list(unpack_lease_results(body))
+        with self._lock:
+            lease = self._leases.get(lease_id)
+        if lease is None:
+            return 200  # Already reported by another worker, or the scan ended
+        _check_lease_results(lease, reported)
+        with self._lock:
+            if self._leases.pop(lease_id, None) is None:
+                return 200
+            self._results.put(reported)
+        return 200
+
+    def close(self) -> None:
+        self.finish()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def run_coordinated(state: _ScanState, hosts: Iterable[str], ports: List[int],
+                    coordinator: Coordinator, settings: Dict[str, Any],
+                    host_window: int = 64,
+                    resume: Optional[ResumeState] = None) -> Iterator[Tuple[str, ScanResult]]:
+    """
+    Coordinator engine: yield (host, result) as worker nodes report their leases.
+
+    Like run_sharded, but the shards go to run_worker processes, possibly
+    on other machines, instead of a local process pool. state does the
+    bookkeeping (built without rate control or retries, which run in the
+    workers). Ending the generator stops handing out leases; the
+    coordinator itself is left running so workers are told the scan is
+    over, and is closed by its owner.
+    """
+    stripes = max(1, -(-len(ports) // _PORTS_PER_LEASE))
+    coordinator.start(make_shards(hosts, ports, stripes, host_window, resume), settings)
+    try:
+        for host, packed in coordinator.results():
+            for result in unpack_results(packed):
+                yield (host, state.complete(host, result.port, 0, result))
+    finally:
+        coordinator.finish()
+
+
+def run_worker(url: str, name: Optional[str] = None, token: Optional[str] = None,
+               poll_interval: float = 1.0, connect_wait: float = 30.0,
+               resource_reserve: int = 64,
+               on_lease: Optional[Callable[[int, int, int], None]] = None) -> int:
+    """
+    Scan leases from the coordinator at url until it reports the scan finished.
+
+    Each lease is scanned with sharding's worker routine, using the
+    engine and settings the coordinator sends, while a background thread
+    renews it. A ResourceGovernor keeps resource_reserve descriptors free.
+
+    Args:
+        url (str): Coordinator address, e.g. "http://10.0.0.5:7878"
+        name (str): Worker name reported to the coordinator (default host:pid)
+        token (str): Shared secret, if the coordinator requires one
+        poll_interval (float): Seconds to wait when no lease is available yet
+        connect_wait (float): Seconds to keep retrying before the coordinator
+            is first reached; once it has been, losing it ends the worker
+        resource_reserve (int): Descriptors kept free for things other than probes
+        on_lease (Callable): Called as on_lease(lease_id, hosts, probes) when a
+            lease has been scanned and reported
+
+    Returns:
+        int: Number of leases scanned
+
+    Raises:
+        OSError: If the coordinator cannot be reached within connect_wait
+    """
+    from urllib.error import HTTPError, URLError
+    from urllib.request import Request, urlopen
+
+    url = url.rstrip("/")
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    headers = {_TOKEN_HEADER: token} if token else {}
+
+    def post(path: str, body: bytes, content_type: str = "application/json") -> Tuple[int, bytes]:
+        request = Request(url + path, data=body, method="POST",
+                          headers={**headers, "Content-Type": content_type})
+        try:
+            with urlopen(request, timeout=30) as response:
+                return response.status, response.read()
+        except HTTPError as exc:
+            return exc.code, b""
+
+    scanned = 0
+    reached = False
+    started = time.monotonic()
+    while True:
+        try:
+            status, body = post("/lease", json.dumps({'worker': name}).encode("utf-8"))
+        except (URLError, OSError) as exc:
+            if reached:
+                return scanned  # The coordinator finished and shut down
+            if time.monotonic() - started > connect_wait:
+                raise OSError(f"Cannot reach coordinator at {url}: {exc}") from None
+            time.sleep(poll_interval)
+            continue
+        reached = True
+        if status == 410:
+            return scanned
+        if status == 403:
+            raise PermissionError("The coordinator rejected the worker token")
+        if status != 200:
+            time.sleep(poll_interval)
+            continue
+
+        lease = json.loads(body)
+        lease_path = f"/{lease['lease']}"
+        stop_renewing = threading.Event()
+
+        def renew() -> None:
+            while not stop_renewing.wait(lease['renew_every']):
+                try:
+                    post("/renew" + lease_path, b"")
+                except OSError:
+                    pass
+
+        renewer = threading.Thread(target=renew, name="lease-renewal", daemon=True)
+        renewer.start()
+        try:
+            results = _scan_shard(lease['hosts'], lease['ports'], **lease['settings'],
+                                  resource_reserve=resource_reserve)
+        finally:
+            stop_renewing.set()
+            renewer.join()
+        try:
+            post("/results" + lease_path, pack_lease_results(results), "application/octet-stream")
+        except OSError:
+            continue  # The lease expires and is scanned again by someone else
+        scanned += 1
+        if on_lease is not None:
+            on_lease(lease['lease'], len(lease['hosts']), len(lease['hosts']) * len(lease['ports']))
@@ -0,0 +1,198 @@
+import os
+import re
+import socket
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional
+
+from host_resolver import address_family
+from output_sinks import ResultSink
+from results import ScanResult
+
+# (service, pattern) pairs, tried in order against whatever a port sent back.
+# Group 1, when a pattern has one, is reported as the banner (product and
+# version); otherwise the first line of the response is.
+SIGNATURES = tuple((service, re.compile(pattern, re.DOTALL)) for service, pattern in (
+    ('SSH', rb'^SSH-[\d.]+-([^\r\n]+)'),
+    ('HTTP', rb'(?i)^HTTP/\d\.\d \d{3}.*?\r\nserver: *([^\r\n]+)'),
+    ('HTTP', rb'^HTTP/\d\.\d \d{3}'),
+    ('SMTP', rb'^220[ -]([^\r\n]*(?:SMTP|Postfix|Exim|Sendmail)[^\r\n]*)'),
+    ('FTP', rb'^220[ -]([^\r\n]*(?:FTP|FileZilla)[^\r\n]*)'),
+    ('POP3', rb'^\+OK ?([^\r\n]*)'),
+    ('IMAP', rb'^\* OK ?([^\r\n]*)'),
+    ('MYSQL', rb'^.\x00\x00\x00\x0a([\d.]+[^\x00]*)\x00'),
+    ('VNC', rb'^(RFB \d{3}\.\d{3})'),
+    ('TELNET', rb'^\xff[\xfb-\xfe]'),
+    ('REDIS', rb'^-(?:ERR|NOAUTH|DENIED) ([^\r\n]*)'),
+    ('SSL/TLS', rb'^[\x15\x16]\x03[\x00-\x04]'),
+))
+
+# Longest banner kept per port
+_BANNER_LENGTH = 80
+
+
+def _tls_extension(kind: int, data: bytes) -> bytes:
+    return struct.pack("!HH", kind, len(data)) + data
+
+
+def _build_client_hello() -> bytes:
+    """A TLS 1.2 ClientHello that modern servers answer with a ServerHello or an alert."""
+    ciphers = (0xC02B, 0xC02F, 0xC02C, 0xC030, 0xCCA9, 0xCCA8, 0x009C, 0x009D, 0x002F, 0x0035)
+    extensions = b"".join((
+        _tls_extension(0x000A, struct.pack("!4H", 6, 0x001D, 0x0017, 0x0018)),  # supported_groups
+        _tls_extension(0x000B, b"\x01\x00"),  # ec_point_formats: uncompressed
+        _tls_extension(0x000D, struct.pack("!5H", 8, 0x0403, 0x0804, 0x0401, 0x0201)),  # signature_algorithms
+    ))
+    body = (b"\x03\x03" + os.urandom(32) + b"\x00"
+            + struct.pack(f"!H{len(ciphers)}H", len(ciphers) * 2, *ciphers)
+            + b"\x01\x00"
+            + struct.pack("!H", len(extensions)) + extensions)
+    handshake = b"\x01" + len(body).to_bytes(3, "big") + body
+    return b"\x16\x03\x01" + struct.pack("!H", len(handshake)) + handshake
+
+
+_TLS_CLIENT_HELLO = _build_client_hello()
+
+
+class Fingerprint:
+    """What a port identified itself as: a service name (None if unknown) and an optional banner."""
+
+    __slots__ = ('service', 'banner')
+
+    def __init__(self, service: Optional[str], banner: Optional[str]):
+        self.service = service
+        self.banner = banner
+
+    def __repr__(self) -> str:
+        return f"Fingerprint({self.service!r}, {self.banner!r})"
+
+
+def _printable(data: bytes) -> str:
+    text = data.decode("utf-8", errors="replace")
+    return "".join(ch if ch.isprintable() else "." for ch in text).strip()[:_BANNER_LENGTH]
+
+
+def match_signature(response: bytes) -> Optional[Fingerprint]:
+    """Match a response against SIGNATURES, or return None if nothing matches."""
+    for service, pattern in SIGNATURES:
+        match = pattern.match(response)
+        if match is None:
+            continue
+        if pattern.groups and match.group(1):
+            return Fingerprint(service, _printable(match.group(1)))
+        return Fingerprint(service, None)
+    return None
+
+
+def _exchange(sock: socket.socket, payload: Optional[bytes]) -> bytes:
+    """Send payload (if any) and return what comes back before the timeout."""
+    try:
+        if payload:
+            sock.sendall(payload)
+        return sock.recv(4096)
+    except OSError:  # Includes socket.timeout
+        return b""
+
+
+def _connect(ip: str, port: int, timeout: float) -> socket.socket:
+    sock = socket.socket(address_family(ip), socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect((ip, port))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def fingerprint(ip: str, port: int, timeout: float = 1.0) -> Optional[Fingerprint]:
+    """
+    Identify the service on an open port from what it says.
+
+    Waits up to timeout for a banner (SSH, FTP, SMTP, ...). A silent port
+    gets an HTTP HEAD request on the same connection, and if that is not
+    understood, a TLS ClientHello on a new one.
+
+    Returns:
+        Fingerprint or None: None if the port could not be identified and
+            sent nothing worth reporting
+    """
+    try:
+        sock = _connect(ip, port, timeout)
+    except OSError:
+        return None
+
+    with sock:
+        response = _exchange(sock, None)
+        if response:
+            return match_signature(response) or Fingerprint(None, _printable(response.split(b"\n", 1)[0]))
+        host = f"[{ip}]" if ":" in ip else ip
+        response = _exchange(sock, f"HEAD / HTTP/1.0\r\nHost: {host}\r\n\r\n".encode("ascii"))
+
+    found = match_signature(response) if response else None
+    if found is not None and found.service != 'SSL/TLS':
+        return found
+
+    try:
+        sock = _connect(ip, port, timeout)
+    except OSError:
+        return found
+    with sock:
+        response = _exchange(sock, _TLS_CLIENT_HELLO)
+    return match_signature(response) if response else found
+
+
+class Fingerprinter:
+    """
+    Runs fingerprint() on open ports in the background.
+
+    The scan engines submit each open port as it is found and move on;
+    probes run on this stage's own thread pool, so a slow or silent
+    service never holds up the sweep. A result's service and banner are
+    updated in place, and it is written to the sink only once that is
+    done, so output files carry the identified service.
+
+    Args:
+        max_workers (int): Ports fingerprinted at the same time
+        timeout (float): Seconds to wait for each response
+    """
+
+    def __init__(self, max_workers: int = 20, timeout: float = 1.0):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fingerprint")
+        self._pending = set()
+        self._lock = threading.RLock()
+
+    def submit(self, host: str, result: ScanResult, sink: Optional[ResultSink] = None) -> None:
+        """Queue an open port; result is updated and then written to sink."""
+        # The future is tracked before its callback can discard it; a future that is
+        # already done runs the callback right here, hence the reentrant lock
+        with self._lock:
+            future = self._executor.submit(self._run, host, result, sink)
+            self._pending.add(future)
+            future.add_done_callback(self._discard)
+
+    def _discard(self, future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+
+    def _run(self, host: str, result: ScanResult, sink: Optional[ResultSink]) -> None:
+        try:
+            found = fingerprint(host, result.port, self.timeout)
+            if found is not None:
+                if found.service:
+                    result.service = found.service
+                result.banner = found.banner
+        finally:
+            if sink is not None:
+                sink.write(host, result)
+
+    def wait(self) -> None:
+        """Block until every submitted port has been fingerprinted."""
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
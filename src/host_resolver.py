@@ -1,38 +1,365 @@
 
 import socket
 import ipaddress
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+# --ip-version choices and the address families they resolve hostnames to
+IP_VERSIONS = {
+    '4': socket.AF_INET,
+    '6': socket.AF_INET6,
+    'both': socket.AF_UNSPEC,
+}
+
+# Literal IPs remembered by resolve_targets to drop repeats
+_RECENT_LITERALS = 65536
 
 
 def is_valid_ip(ip: str) -> bool:
    
     try:
        
-        ipaddress.IPv4Address(ip)
+        ipaddress.ip_address(ip)
         return True
     except ValueError:
        
         return False
 
 
-def resolve_hostname(hostname: str) -> str:
+def canonical_ip(ip: str) -> Optional[str]:
+    """Return the standard form of an IP address string ("2001:db8::1"), or None if it is not one."""
+    try:
+        return str(ipaddress.ip_address(ip))
+    except ValueError:
+        return None
+
+
+def address_family(ip: str) -> int:
+    """Return socket.AF_INET or socket.AF_INET6 for an IP address string."""
+    return socket.AF_INET6 if ":" in ip else socket.AF_INET
+
+
+def family_name(ip: str) -> str:
+    """Return "IPv4" or "IPv6" for an IP address string, for reports."""
+    return "IPv6" if ":" in ip else "IPv4"
+
+
+class ResolutionError(Exception):
+    """Raised when a hostname cannot be resolved; the message says why."""
+
+
+class DnsCache:
+    """
+    Thread-safe LRU cache of hostname lookups with a time-to-live.
+
+    getaddrinfo does not expose record TTLs, so every entry lives for a
+    fixed ttl seconds. Failed lookups are cached too, for negative_ttl
+    seconds, so a list full of dead names is not retried per target.
+
+    Args:
+        max_entries (int): Least recently used entries are evicted beyond this
+        ttl (float): Seconds a successful lookup stays valid
+        negative_ttl (float): Seconds a failed lookup stays valid
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 300.0, negative_ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[tuple, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """Return the cached addresses or ResolutionError for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value) -> None:
+        ttl = self.negative_ttl if isinstance(value, ResolutionError) else self.ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _Done:
+    """An already available result with the result() method of a Future."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+
+class Resolver:
+    """
+    Resolves hostnames to every address they have, concurrently and cached.
+
+    Lookups use getaddrinfo, so both A and AAAA records are returned
+    (filtered by family). resolve_many runs lookups on a thread pool, since
+    getaddrinfo blocks and the standard library has no non-blocking
+    equivalent (asyncio's version uses a thread pool as well).
+
+    Args:
+        cache (DnsCache): Lookup cache; a new one by default
+        max_workers (int): Concurrent lookups in resolve_many
+        family (int): socket.AF_INET, socket.AF_INET6 or socket.AF_UNSPEC for both
+    """
+
+    def __init__(self, cache: Optional[DnsCache] = None, max_workers: int = 32,
+                 family: int = socket.AF_UNSPEC):
+        self.cache = cache if cache is not None else DnsCache()
+        self.max_workers = max_workers
+        self.family = family
+
+    def resolve(self, hostname: str, family: Optional[int] = None) -> List[str]:
+        """
+        Return every address of hostname, without duplicates, in resolver order.
+
+        Raises:
+            ResolutionError: If the name does not resolve
+        """
+        family = self.family if family is None else family
+        key = (hostname.lower(), family)
+        cached = self.cache.get(key)
+        if cached is None:
+            cached = self._lookup(hostname, family)
+            self.cache.put(key, cached)
+        if isinstance(cached, ResolutionError):
+            raise cached
+        return list(cached)
+
+    @staticmethod
+    def _lookup(hostname: str, family: int):
+        try:
+            infos = socket.getaddrinfo(hostname, None, family, socket.SOCK_STREAM)
+        except socket.gaierror:  # More specific: DNS resolution error
+            return ResolutionError("DNS resolution failed")
+        except (socket.error, UnicodeError):  # General network error
+            return ResolutionError("Network error occurred")
+        # Drop IPv6 scope ids and repeated records, keep the resolver's order
+        addresses = tuple(dict.fromkeys(info[4][0].split("%", 1)[0] for info in infos))
+        if not addresses:
+            return ResolutionError("DNS resolution failed")
+        return addresses
+
+    def resolve_many(self, hostnames: Iterable[str],
+                     family: Optional[int] = None) -> Iterator[Tuple[str, List[str], str]]:
+        """
+        Resolve hostnames concurrently, yielding results in input order.
+
+        IP addresses of either family are passed through without a lookup.
+
+        At most 4 * max_workers lookups are outstanding, so a generator of
+        millions of names is consumed lazily.
+
+        Yields:
+            (hostname, addresses, message) tuples; addresses is empty and
+            message explains why when resolution failed
+        """
+        def lookup(hostname: str) -> Tuple[str, List[str], str]:
+            if is_valid_ip(hostname):
+                return (hostname, [hostname], "Valid IP address")
+            try:
+                return (hostname, self.resolve(hostname, family), "Hostname resolved successfully")
+            except ResolutionError as exc:
+                return (hostname, [], str(exc))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for hostname in hostnames:
+                # IP addresses need no lookup, so they skip the pool
+                if is_valid_ip(hostname):
+                    pending.append(_Done(lookup(hostname)))
+                else:
+                    pending.append(executor.submit(lookup, hostname))
+                if len(pending) >= 4 * self.max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+_default_resolver: Optional[Resolver] = None
+
+
+def default_resolver() -> Resolver:
+    """Return the process-wide Resolver, so lookups share one cache."""
+    global _default_resolver
+    if _default_resolver is None:
+        _default_resolver = Resolver()
+    return _default_resolver
+
+
+def resolve_hostname(hostname: str, family: int = socket.AF_INET) -> str:
    
     try:
-        ip = socket.gethostbyname(hostname)
-        return ip
-    except socket.gaierror:  # More specific: DNS resolution error
-        return "DNS resolution failed"
-    except socket.error:     # General network error
-        return "Network error occurred"
+        return default_resolver().resolve(hostname, family)[0]
+    except ResolutionError as exc:
+        return str(exc)
 
 
-def validate_target(target: str) -> tuple[str, str]:
+def validate_target(target: str, family: int = socket.AF_INET) -> tuple[str, str]:
    
     if is_valid_ip(target):
         return (target, "Valid IP address")
     else:
-        resolved_ip = resolve_hostname(target)
-        if is_valid_ip(resolved_ip):
-            return (resolved_ip, "Hostname resolved successfully")
+        try:
+            addresses = default_resolver().resolve(target, family)
+        except ResolutionError as exc:
+            return ("", str(exc))
+        return (addresses[0], "Hostname resolved successfully")
+
+
+def _expand_dash_range(part: str) -> Iterator[str]:
+    """
+    Expand "10.0.0.1-254", "10.0.0.1-10.0.0.254" or "2001:db8::1-ff" into
+    individual addresses.
+    """
+    start_str, end_str = part.split("-", 1)
+    start = ipaddress.ip_address(start_str.strip())
+    end_str = end_str.strip()
+    
+    if "." in end_str or ":" in end_str:
+        end = ipaddress.ip_address(end_str)
+        if end.version != start.version:
+            raise ValueError(f"Invalid range: {part}")
+    elif start.version == 4:
+        # Short form: only the last octet is given
+        last_octet = int(end_str)
+        if not 0 <= last_octet <= 255:
+            raise ValueError(f"Invalid range end: {end_str}")
+        end = ipaddress.IPv4Address((int(start) & 0xFFFFFF00) | last_octet)
+    else:
+        # Short form: only the last 16-bit group is given, in hex
+        last_group = int(end_str, 16)
+        if not 0 <= last_group <= 0xFFFF:
+            raise ValueError(f"Invalid range end: {end_str}")
+        end = ipaddress.IPv6Address((int(start) & ~0xFFFF) | last_group)
+    
+    if start > end:
+        raise ValueError(f"Invalid range: {part}")
+    
+    address_type = type(start)
+    for value in range(int(start), int(end) + 1):
+        yield str(address_type(value))
+
+
+def expand_target(part: str) -> Iterator[str]:
+    """
+    Expand a single target specification into individual targets.
+    
+    Supports CIDR blocks ("10.0.0.0/16", "2001:db8::/120"), dash ranges
+    ("10.0.0.1-254", "10.0.0.1-10.0.0.20", "2001:db8::1-ff"), plain IPv4
+    and IPv6 addresses and hostnames. Addresses are yielded in standard
+    form (see canonical_ip), so one host is always the same string;
+    hostnames are yielded unchanged and resolved later by validate_target.
+    
+    Raises:
+        ValueError: If a CIDR block or range is malformed
+    """
+    part = part.strip()
+    if not part:
+        return
+    
+    if "/" in part:
+        network = ipaddress.ip_network(part, strict=False)
+        for address in network.hosts():
+            yield str(address)
+    elif "-" in part and is_valid_ip(part.split("-", 1)[0].strip()):
+        yield from _expand_dash_range(part)
+    else:
+        yield canonical_ip(part) or part
+
+
+def expand_targets(target_spec: str) -> Iterator[str]:
+    """
+    Lazily expand a comma-separated target specification.
+    
+    Example: "10.0.0.0/30,192.168.1.10-12,example.com"
+    
+    Targets are produced one at a time, so a /8 never needs to be held in
+    memory as a list.
+    """
+    for part in target_spec.split(","):
+        yield from expand_target(part)
+
+
+def read_target_file(path: str) -> Iterator[str]:
+    """
+    Lazily read targets from a file (the -iL option).
+    
+    Each line may hold one or more comma or whitespace separated target
+    specifications. Blank lines and lines starting with "#" are ignored.
+    """
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            for spec in line.replace(",", " ").split():
+                yield from expand_target(spec)
+
+
+def resolve_targets(targets: Iterable[str], resolver: Optional[Resolver] = None,
+                    family: int = socket.AF_INET) -> Iterator[tuple[str, str, str]]:
+    """
+    Lazily validate and resolve targets.
+    
+    Hostnames are resolved concurrently and yield one tuple per address.
+    Literal IPs are yielded in standard form (see canonical_ip). A
+    repeated address is yielded only the first time, so two names for
+    one host, a name and its literal IP, or an IP listed twice are
+    scanned once. Addresses from lookups are all remembered; of literal
+    IPs only the last _RECENT_LITERALS are, so memory does not grow with
+    the size of CIDR blocks and ranges (an address repeated further
+    apart is scanned again, and its first results are kept; see
+    HostResults.add). With family socket.AF_UNSPEC a dual-stack name yields
+    its IPv4 and IPv6 addresses, which are then scanned in the same run.
+    
+    Args:
+        targets (Iterable[str]): IP addresses and hostnames, possibly a generator
+        resolver (Resolver): Resolver to use (default: default_resolver())
+        family (int): Address family hostnames resolve to (see IP_VERSIONS);
+            IP addresses are always kept, whatever their family
+    
+    Yields:
+        (target, ip, message) tuples, where ip is "" if resolution failed
+    """
+    resolver = resolver or default_resolver()
+    resolved = set()
+    recent: "OrderedDict[str, None]" = OrderedDict()
+    for target, addresses, message in resolver.resolve_many(targets, family):
+        if not addresses:
+            yield (target, "", message)
+            continue
+        literal = canonical_ip(target)
+        if literal is not None:
+            if literal not in resolved and literal not in recent:
+                recent[literal] = None
+                if len(recent) > _RECENT_LITERALS:
+                    recent.popitem(last=False)
+                yield (target, literal, message)
         else:
-            return ("", resolved_ip)
\ No newline at end of file
+            for ip in addresses:
+                if ip not in resolved:
+                    resolved.add(ip)
+                    yield (target, ip, message)
@@ -0,0 +1,280 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, IO, List, Optional, Tuple
+
+from tcp_scanner import STATUS_CODES, STATUS_INDEX
+
+# Upper bounds (seconds) of the connect latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class ScanMetrics:
+    """
+    Live counters for a running scan.
+
+    The engines call probe_queued when a probe is handed to the executor,
+    probe_started when it actually begins connecting and probe_finished
+    with its status and response time. Each call is one short locked
+    update, cheap next to a connect. Extra gauges (retry queue depth,
+    current probe rate) are read through callbacks only when metrics are
+    rendered.
+
+    Sharded scans only see results as shards return, so they report
+    completions and latencies but not probes in flight.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.queued = 0
+        self.started = 0
+        self.finished = 0
+        self.completions = [0] * len(STATUS_CODES)
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+
+    def probe_queued(self) -> None:
+        with self._lock:
+            self.queued += 1
+
+    def probe_started(self) -> None:
+        with self._lock:
+            self.started += 1
+
+    def probe_finished(self, status: str, latency: float) -> None:
+        code = STATUS_INDEX.get(status, 0)
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, latency)
+        with self._lock:
+            self.finished += 1
+            self.completions[code] += 1
+            self.latency_buckets[bucket] += 1
+            self.latency_sum += latency
+
+    def add_gauge(self, name: str, help_text: str, read: Callable[[], float]) -> None:
+        """Register a value that is read each time the metrics are rendered."""
+        self._gauges[name] = (help_text, read)
+
+    @property
+    def in_flight(self) -> int:
+        """Probes connecting right now."""
+        return max(0, self.started - self.finished)
+
+    @property
+    def queue_depth(self) -> int:
+        """Probes handed to the executor that have not started yet."""
+        return max(0, self.queued - self.started)
+
+    def latency_quantile(self, fraction: float) -> Optional[float]:
+        """Upper bound of the bucket holding the given quantile (inf for the last bucket)."""
+        with self._lock:
+            buckets = list(self.latency_buckets)
+        total = sum(buckets)
+        if not total:
+            return None
+        rank = fraction * total
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            finished = self.finished
+            completions = list(self.completions)
+            buckets = list(self.latency_buckets)
+            latency_sum = self.latency_sum
+
+        lines = [
+            "# HELP portspy_probes_in_flight Probes currently connecting",
+            "# TYPE portspy_probes_in_flight gauge",
+            f"portspy_probes_in_flight {self.in_flight}",
+            "# HELP portspy_probe_queue_depth Probes submitted to the executor but not started",
+            "# TYPE portspy_probe_queue_depth gauge",
+            f"portspy_probe_queue_depth {self.queue_depth}",
+            "# HELP portspy_probes_completed_total Completed probes by port status",
+            "# TYPE portspy_probes_completed_total counter",
+        ]
+        for code, status in enumerate(STATUS_CODES):
+            lines.append(f'portspy_probes_completed_total{{status="{status}"}} {completions[code]}')
+
+        lines += [
+            "# HELP portspy_connect_latency_seconds Time from starting a connect to its outcome",
+            "# TYPE portspy_connect_latency_seconds histogram",
+        ]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, buckets):
+            cumulative += count
+            lines.append(f'portspy_connect_latency_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'portspy_connect_latency_seconds_bucket{{le="+Inf"}} {finished}')
+        lines.append(f"portspy_connect_latency_seconds_sum {latency_sum:.6f}")
+        lines.append(f"portspy_connect_latency_seconds_count {finished}")
+
+        lines += [
+            "# HELP portspy_scan_elapsed_seconds Seconds since the scan started",
+            "# TYPE portspy_scan_elapsed_seconds gauge",
+            f"portspy_scan_elapsed_seconds {time.monotonic() - self.started_at:.3f}",
+        ]
+        for name, (help_text, read) in self._gauges.items():
+            lines += [
+                f"# HELP portspy_{name} {help_text}",
+                f"# TYPE portspy_{name} gauge",
+                f"portspy_{name} {read()}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def stats_line(self) -> str:
+        """One-line summary for --stats-interval."""
+        elapsed = time.monotonic() - self.started_at
+        with self._lock:
+            finished = self.finished
+            completions = list(self.completions)
+        statuses = " ".join(f"{STATUS_CODES[code]}={n}" for code, n in enumerate(completions) if n)
+        p50, p99 = self.latency_quantile(0.50), self.latency_quantile(0.99)
+        latency = f" p50<={p50 * 1000:g}ms p99<={p99 * 1000:g}ms" if p50 is not None else ""
+        gauges = "".join(f" {name}={read()}" for name, (_, read) in self._gauges.items())
+        return (f"[stats] {elapsed:.1f}s done={finished} ({finished / elapsed if elapsed else 0:.0f}/s) "
+                f"{statuses} in_flight={self.in_flight} queued={self.queue_depth}{latency}{gauges}")
+
+
+class MetricsServer:
+    """
+    Serves ScanMetrics at http://host:port/metrics for Prometheus to scrape.
+
+    Runs on a daemon thread; binds to localhost unless told otherwise.
+    """
+
+    def __init__(self, metrics: ScanMetrics, port: int, host: str = "127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.address = self._server.server_address
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StatsReporter:
+    """Prints ScanMetrics.stats_line every interval seconds (to stderr by default)."""
+
+    def __init__(self, metrics: ScanMetrics, interval: float, stream: Optional[IO] = None):
+        self.metrics = metrics
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stats-reporter", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            print(self.metrics.stats_line(), file=self.stream, flush=True)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+# Frames in these files mean a thread is waiting for work, not doing any
+_IDLE_FILES = (
+    "threading.py",
+    "queue.py",
+    "selectors.py",
+    os.path.join("concurrent", "futures", "thread.py"),
+    os.path.join("concurrent", "futures", "_base.py"),
+)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler covering every thread.
+
+    cProfile only sees the thread it was enabled in, but scan work runs on
+    pool threads and the event loop. This samples the stack of every
+    thread each interval seconds and counts the innermost function (self
+    time) and every function on the stack (total time). Threads parked
+    waiting for work are counted as idle.
+
+    Args:
+        interval (float): Seconds between samples
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = 0
+        self.idle = 0
+        self.own: Counter = Counter()
+        self.total: Counter = Counter()
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                self.samples += 1
+                if frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    self.idle += 1
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.own[stack[0]] += 1
+                self.total.update(set(stack))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def report(self, limit: int = 25) -> str:
+        """Top functions by self samples, with their share of all samples."""
+        if not self.samples:
+            return "No profile samples collected"
+        busy = self.samples - self.idle
+        lines = [f"Profile: {self.samples} samples every {self.interval * 1000:g}ms across threads, "
+                 f"{self.idle / self.samples:.0%} idle",
+                 f"{'SELF':>7} {'TOTAL':>7}  FUNCTION"]
+        for name, count in self.own.most_common(limit):
+            lines.append(f"{count / busy:>7.1%} {self.total[name] / busy:>7.1%}  {name}")
+        return "\n".join(lines)
+
+    def write_collapsed(self, path: str) -> None:
+        """Write stacks in the collapsed format read by flamegraph tools."""
+        with open(path, "w", encoding="utf-8") as handle:
+            for stack, count in self.stacks.most_common():
+                handle.write(f"{stack} {count}\n")
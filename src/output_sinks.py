@@ -0,0 +1,229 @@
+import abc
+import csv
+import ipaddress
+import json
+import queue
+import struct
+import threading
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+
+from tcp_scanner import STATUS_CODES, STATUS_INDEX
+
+# Items taken from the queue per write, so the writer thread wakes up rarely
+_BATCH_SIZE = 512
+
+_CLOSE = object()
+
+
+class ResultSink(abc.ABC):
+    """
+    Streams results to a file as they arrive.
+
+    write() only puts the result on a queue; a background thread formats
+    it and writes through a buffered file, so disk I/O never blocks the
+    probe loop. Subclasses implement _write_batch and may override _open.
+
+    Args:
+        path (str): Output file path
+        append (bool): Add to an existing file instead of replacing it
+    """
+
+    binary = False
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.append = append
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._error: Optional[BaseException] = None
+        self._handle = self._open(path)
+        self._thread = threading.Thread(target=self._run, name=f"sink-{path}", daemon=True)
+        self._thread.start()
+
+    def _open(self, path: str) -> IO:
+        mode = ("a" if self.append else "w") + ("b" if self.binary else "")
+        if self.binary:
+            return open(path, mode, buffering=1024 * 1024)
+        return open(path, mode, buffering=1024 * 1024, encoding="utf-8", newline="")
+
+    @abc.abstractmethod
+    def _write_batch(self, batch: List[Tuple[str, Dict[str, any]]]) -> None:
+        """Write one batch of (host, result) pairs through self._handle."""
+
+    def _run(self) -> None:
+        closing = False
+        while not closing:
+            batch = []
+            item = self._queue.get()
+            while True:
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+                if len(batch) >= _BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch and self._error is None:
+                try:
+                    self._write_batch(batch)
+                except Exception as exc:  # Reported from close()
+                    self._error = exc
+        try:
+            # Also flushes the buffer, which can fail (e.g. a full disk)
+            self._handle.close()
+        except Exception as exc:
+            if self._error is None:
+                self._error = exc
+
+    def write(self, host: str, result: Dict[str, any]) -> None:
+        """Queue one result for writing."""
+        self._queue.put((host, result))
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        """The first error hit while writing, or None."""
+        return self._error
+
+    def close(self) -> None:
+        """
+        Flush everything queued so far and close the file.
+
+        Raises:
+            Exception: The first error hit while writing, if any
+        """
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+class JsonLinesSink(ResultSink):
+    """
+    One JSON object per line: {"host", "port", "status", "service", "response_time"},
+    plus "banner" for fingerprinted ports that sent one.
+    """
+
+    @staticmethod
+    def _record(host: str, r: Dict[str, any]) -> Dict[str, any]:
+        record = {
+            'host': host,
+            'port': r['port'],
+            'status': r['status'],
+            'service': r['service'],
+            'response_time': r['response_time']
+        }
+        banner = r.get('banner')
+        if banner is not None:
+            record['banner'] = banner
+        return record
+
+    def _write_batch(self, batch: List[Tuple[str, Dict[str, any]]]) -> None:
+        self._handle.write("".join(
+            json.dumps(self._record(host, r)) + "\n"
+            for host, r in batch
+        ))
+
+
+class CsvSink(ResultSink):
+    """CSV with a header row: host,port,status,service,response_time."""
+
+    FIELDS = ('host', 'port', 'status', 'service', 'response_time')
+
+    def _open(self, path: str) -> IO:
+        handle = super()._open(path)
+        self._csv = csv.writer(handle)
+        if handle.tell() == 0:
+            self._csv.writerow(self.FIELDS)
+        return handle
+
+    def _write_batch(self, batch: List[Tuple[str, Dict[str, any]]]) -> None:
+        self._csv.writerows(
+            (host, r['port'], r['status'], r['service'], r['response_time'])
+            for host, r in batch
+        )
+
+
+# Binary format: the magic header, then one record per result:
+#   address length (1 byte, 4 or 16) | packed address | port (2) | status code (1) | time in ms (4)
+BINARY_MAGIC = b"PSPYBIN1"
+_BINARY_TAIL = struct.Struct("!HBI")
+
+
+class BinarySink(ResultSink):
+    """
+    Compact binary records, 12 bytes per IPv4 result and 24 per IPv6 result.
+
+    Service names are not stored; they follow from the port. Use
+    read_binary_results to decode.
+    """
+
+    binary = True
+
+    def _open(self, path: str) -> IO:
+        handle = super()._open(path)
+        if handle.tell() == 0:
+            handle.write(BINARY_MAGIC)
+        self._addresses: Dict[str, bytes] = {}
+        return handle
+
+    def _address(self, host: str) -> bytes:
+        packed = self._addresses.get(host)
+        if packed is None:
+            raw = ipaddress.ip_address(host).packed
+            packed = self._addresses[host] = bytes((len(raw),)) + raw
+        return packed
+
+    def _write_batch(self, batch: List[Tuple[str, Dict[str, any]]]) -> None:
+        self._handle.write(b"".join(
+            self._address(host) + _BINARY_TAIL.pack(
+                r['port'], STATUS_INDEX.get(r['status'], 0), int(round(r['response_time'] * 1000))
+            )
+            for host, r in batch
+        ))
+
+
+def read_binary_results(path: str) -> Iterator[Tuple[str, int, str, float]]:
+    """
+    Decode a file written by BinarySink.
+
+    Yields:
+        (host, port, status, response_time) tuples
+    """
+    with open(path, "rb") as handle:
+        if handle.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{path} is not a PortSpy binary results file")
+
+        while True:
+            length = handle.read(1)
+            if not length:
+                return
+            record = handle.read(length[0] + _BINARY_TAIL.size)
+            if len(record) != length[0] + _BINARY_TAIL.size:
+                raise ValueError(f"{path} ends with a truncated record")
+            host = str(ipaddress.ip_address(record[:length[0]]))
+            port, code, millis = _BINARY_TAIL.unpack_from(record, length[0])
+            yield (host, port, STATUS_CODES[code], millis / 1000)
+
+
+class MultiSink:
+    """Fans results out to several sinks."""
+
+    def __init__(self, sinks: List[ResultSink]):
+        self.sinks = sinks
+
+    def write(self, host: str, result: Dict[str, any]) -> None:
+        for sink in self.sinks:
+            sink.write(host, result)
+
+    def close(self) -> None:
+        """Close every sink, even after one fails, then raise the first error."""
+        error = None
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as exc:
+                error = error or exc
+        if error is not None:
+            raise error
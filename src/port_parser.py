@@ -1,10 +1,242 @@
-from typing import List, Set
+import bisect
+import math
+import random
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+MIN_PORT = 1
+MAX_PORT = 65535
+
+# Ports most often found open on Internet hosts, most likely first
+TOP_100_PORTS = (
+    80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306, 8080,
+    1723, 111, 995, 993, 5900, 1025, 587, 8888, 199, 1720, 465, 548, 113, 81,
+    6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000, 32768, 554, 26, 1433,
+    49152, 2001, 515, 8008, 49154, 1027, 5666, 646, 5000, 5631, 631, 49153,
+    8081, 2049, 88, 79, 5800, 106, 2121, 1110, 49155, 6000, 513, 990, 5357,
+    427, 49156, 543, 544, 5101, 144, 7, 389, 8009, 3128, 444, 9999, 5009,
+    7070, 5190, 3000, 5432, 1900, 3986, 13, 1029, 9, 5051, 6646, 49157, 1028,
+    873, 1755, 2717, 4899, 9100, 119, 37,
+)
+
+# Further commonly exposed services (databases, caches, admin and dev
+# servers), used to extend TOP_100_PORTS into the top1000 set
+_COMMON_SERVICE_PORTS = (
+    1521, 6379, 27017, 9200, 9300, 11211, 5672, 15672, 2375, 2376, 6443,
+    10250, 9090, 9091, 3001, 4000, 4443, 5001, 5601, 7001, 7002, 8001, 8002,
+    8010, 8082, 8083, 8088, 8089, 8090, 8180, 8181, 8222, 8280, 8281, 8834,
+    8880, 8983, 9000, 9001, 9043, 9080, 9081, 9418, 9443, 10001, 1080, 1194,
+    1352, 1434, 1494, 1812, 1883, 2082, 2083, 2086, 2087, 2095, 2096, 2181,
+    2222, 2483, 2484, 3260, 3268, 3269, 5433, 5984, 6000, 6660, 6667, 7000,
+    7474, 8020, 8086, 8161, 8333, 8500, 8545, 8686, 9042, 9092, 9160, 9201,
+    9600, 11000, 25565, 50000, 50070,
+)
+
+PORT_ORDERS = ('sequential', 'random', 'stratified')
 
 
 def validate_port(port: int) -> bool:
   
     # TCP ports must be between 1 and 65535 (inclusive)
-    return 1 <= port <= 65535
+    return MIN_PORT <= port <= MAX_PORT
+
+
+def _top_ports(count: int) -> List[int]:
+    """Build a likelihood-ordered list of the top count ports."""
+    ordered = []
+    seen = set()
+
+    def extend(ports: Iterable[int]) -> None:
+        for port in ports:
+            if len(ordered) >= count:
+                return
+            if port not in seen:
+                seen.add(port)
+                ordered.append(port)
+
+    extend(TOP_100_PORTS)
+    extend(_COMMON_SERVICE_PORTS)
+    if len(ordered) < count:
+        # Then registered services, then the remaining privileged ports
+        from service_map import BUNDLED_SERVICES_FILE, parse_services_file
+        table = parse_services_file(BUNDLED_SERVICES_FILE)
+        extend(port for port, name in enumerate(table) if name)
+        extend(range(MIN_PORT, 1025))
+    return ordered
+
+
+def named_port_set(name: str) -> Optional[List[int]]:
+    """Return the ports of a named set ("top100", "top1000", "topN"), most likely first."""
+    name = name.lower()
+    if name == "all":
+        return None
+    if name.startswith("top") and name[3:].isdigit():
+        return _top_ports(int(name[3:]))
+    raise KeyError(name)
+
+
+class PortSet:
+    """
+    A set of TCP ports stored as merged, sorted intervals.
+
+    Membership is a binary search and len() is a sum over intervals, so
+    "1-65535" costs a single (1, 65535) tuple instead of a 65,535-entry
+    list. Ports from named sets (top100, ...) keep their likelihood order
+    and are yielded first by the default iteration.
+
+    Example:
+        >>> ports = PortSet.from_spec("top100,8000-8100")
+        >>> 8050 in ports, len(ports)
+        (True, 196)
+    """
+
+    __slots__ = ('_starts', '_ends', '_priority')
+
+    def __init__(self, intervals: Iterable[Tuple[int, int]] = (),
+                 priority: Iterable[int] = ()):
+        merged: List[List[int]] = []
+        for start, end in sorted(intervals):
+            start, end = max(start, MIN_PORT), min(end, MAX_PORT)
+            if start > end:
+                continue
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self._starts = [start for start, _ in merged]
+        self._ends = [end for _, end in merged]
+        self._priority = tuple(dict.fromkeys(port for port in priority if port in self))
+
+    @classmethod
+    def from_spec(cls, port_string: str) -> "PortSet":
+        """
+        Parse a port specification such as "22,80-90,top100".
+
+        Invalid parts are ignored, like parse_ports has always done.
+        """
+        intervals: List[Tuple[int, int]] = []
+        priority: List[int] = []
+
+        for part in (port_string or "").split(","):
+            part = part.strip()
+            if not part:
+                continue
+
+            if "-" in part:
+                bounds = part.split("-")
+                if len(bounds) != 2:
+                    continue
+                try:
+                    start, end = int(bounds[0]), int(bounds[1])
+                except ValueError:
+                    continue
+                if start <= end:
+                    intervals.append((start, end))
+                continue
+
+            try:
+                port = int(part)
+            except ValueError:
+                try:
+                    named = named_port_set(part)
+                except KeyError:
+                    continue
+                if named is None:
+                    intervals.append((MIN_PORT, MAX_PORT))
+                else:
+                    intervals.extend((port, port) for port in named)
+                    priority.extend(named)
+                continue
+
+            if validate_port(port):
+                intervals.append((port, port))
+
+        return cls(intervals, priority)
+
+    @property
+    def intervals(self) -> List[Tuple[int, int]]:
+        return list(zip(self._starts, self._ends))
+
+    def __contains__(self, port: int) -> bool:
+        i = bisect.bisect_right(self._starts, port) - 1
+        return i >= 0 and port <= self._ends[i]
+
+    def __len__(self) -> int:
+        return sum(end - start + 1 for start, end in zip(self._starts, self._ends))
+
+    def __bool__(self) -> bool:
+        return bool(self._starts)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PortSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __repr__(self) -> str:
+        spec = ",".join(str(s) if s == e else f"{s}-{e}" for s, e in self.intervals)
+        return f"PortSet({spec!r})"
+
+    def _offsets(self) -> List[int]:
+        """Number of ports before each interval, for index lookups."""
+        offsets = []
+        total = 0
+        for start, end in zip(self._starts, self._ends):
+            offsets.append(total)
+            total += end - start + 1
+        return offsets
+
+    def ascending(self) -> Iterator[int]:
+        """Every port in ascending order."""
+        for start, end in zip(self._starts, self._ends):
+            yield from range(start, end + 1)
+
+    def __iter__(self) -> Iterator[int]:
+        """Named-set ports in likelihood order, then every other port ascending."""
+        yield from self._priority
+        if not self._priority:
+            yield from self.ascending()
+            return
+        first = set(self._priority)
+        for port in self.ascending():
+            if port not in first:
+                yield port
+
+    def ordered(self, order: str = 'sequential', seed: Optional[int] = None) -> Iterator[int]:
+        """
+        Iterate the ports in a scan order.
+
+        Args:
+            order (str): "sequential" (named sets first, then ascending),
+                "random" (a seeded shuffle, so consecutive probes follow no
+                stride an IDS could pick up) or "stratified" (walks the
+                port space in strides so consecutive probes are spread
+                across the whole range)
+            seed (int): Seed for "random", so a scan order can be repeated
+        """
+        if order == 'sequential':
+            yield from self
+            return
+
+        size = len(self)
+        if size == 0:
+            return
+        offsets = self._offsets()
+
+        def nth(index: int) -> int:
+            interval = bisect.bisect_right(offsets, index) - 1
+            return self._starts[interval] + index - offsets[interval]
+
+        if order == 'random':
+            # Callers build the port list anyway, so shuffling one costs nothing extra
+            ports = list(self.ascending())
+            random.Random(seed).shuffle(ports)
+            yield from ports
+        elif order == 'stratified':
+            stride = max(1, math.isqrt(size))
+            for first in range(stride):
+                for i in range(first, size, stride):
+                    yield nth(i)
+        else:
+            raise ValueError(f"Unknown port order: {order}")
 
 
 def parse_port_range(port_range: str) -> List[int]:
@@ -24,12 +256,8 @@ def parse_port_range(port_range: str) -> List[int]:
             return []  # Invalid range
         
         
-        result = []
-        for port in range(start_port, end_port + 1):  # +1 because range() excludes end
-            if validate_port(port):  # Only include valid ports
-                result.append(port)
-        
-        return result
+        # Clamp to the valid port range instead of validating each port
+        return list(range(max(start_port, MIN_PORT), min(end_port, MAX_PORT) + 1))
         
     except ValueError:
        
@@ -40,36 +268,5 @@ def parse_ports(port_string: str) -> List[int]:
     
     if not port_string or not port_string.strip():
         return [] 
-    #combining all ports here
-    all_ports = [] 
-    
-   
-    parts = port_string.split(",")
-    
-   
-    for part in parts:
-        part = part.strip()  # Remove whitespace
-        if not part:
-            continue  
-        
-       
-        if "-" in part:
-           
-            range_ports = parse_port_range(part)
-            all_ports.extend(range_ports)  
-        else:
-            # It's a single port
-            try:
-                port = int(part)
-                if validate_port(port):  # Only adding valid ports
-                    all_ports.append(port)
-            except ValueError:
-               
-                continue
-    
-   
-    unique_ports = list(set(all_ports)) 
-    unique_ports.sort()  
-    
-    return unique_ports
-
+    # Merged intervals instead of a set of every port that then gets sorted
+    return list(PortSet.from_spec(port_string).ascending())
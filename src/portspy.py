@@ -1,14 +1,39 @@
 import argparse
+import sys
 import time
-from typing import List
-from colorama import init, Fore, Back, Style
+from itertools import chain, islice
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List
 
-from host_resolver import validate_target
-from port_parser import parse_ports
-from tcp_scanner import tcp_scan_ports, format_scan_results
+from adaptive_timeout import AdaptiveTimeout
+from checkpoint import Checkpoint, ResumeState
+from colors import Fore, Back, Style, set_color
+from discovery import DISCOVERY_PORTS, discover_hosts, split_concurrency
+from fingerprint import Fingerprinter
+from metrics import MetricsServer, SamplingProfiler, ScanMetrics, StatsReporter
+from host_resolver import (
+    IP_VERSIONS,
+    Resolver,
+    expand_targets,
+    family_name,
+    is_valid_ip,
+    read_target_file,
+    resolve_targets,
+    validate_target,
+)
+from output_sinks import BinarySink, CsvSink, JsonLinesSink, MultiSink
+from port_parser import PORT_ORDERS, PortSet
+from rate_control import RateController
+from resource_governor import ResourceGovernor
+from scanner import Scanner
+from scheduler import HostFeed, RetryQueue
+from service_map import BUNDLED_SERVICES_FILE, load_services
+from syn_scanner import syn_unavailable
+from results import HostResults
+from tcp_scanner import ConsoleReporter, format_scan_results
 
-# Initialize colorama for cross-platform colored output
-init(autoreset=True)
+# scan_store pulls in sqlite3, so it is only imported when --store is used
+if TYPE_CHECKING:
+    from scan_store import ScanStore, StoredScan
 
 
 def get_user_input():
@@ -49,8 +74,437 @@ def get_user_input():
     return target, ports_input
 
 
+def adaptive_bounds(args):
+    """Return (floor, ceiling) for adaptive timeouts, or None when disabled."""
+    if not args.adaptive_timeout:
+        return None
+    # --timeout is the starting point, so the default ceiling leaves room above it
+    return (args.min_timeout, args.max_timeout or 2 * args.timeout)
+
+
+def build_timeout_policy(args):
+    """Create the AdaptiveTimeout requested on the command line, if any."""
+    bounds = adaptive_bounds(args)
+    if bounds is None:
+        return None
+    return AdaptiveTimeout(args.timeout, *bounds)
+
+
+def services_file_path(args):
+    """Return the services file selected with --services-file, or None for the system one."""
+    if args.services_file == 'bundled':
+        return BUNDLED_SERVICES_FILE
+    return args.services_file
+
+
+def build_rate_controller(args):
+    """Create the RateController requested with --max-rate, if any."""
+    if not args.max_rate:
+        return None
+    return RateController(args.max_rate)
+
+
+def build_retry_queue(args):
+    """Create the RetryQueue requested with --retries, if any."""
+    if args.retries <= 0:
+        return None
+    return RetryQueue(max_retries=args.retries)
+
+
+def build_resource_governor(args):
+    """Raise the descriptor limit and budget sockets, keeping room for fingerprint connects."""
+    reserve = 64 + (args.fingerprint_concurrency if args.fingerprint else 0)
+    return ResourceGovernor(reserve=reserve)
+
+
+def run_discovery(args, hosts: Iterable[str], concurrency: int, timeout_policy, rate, governor,
+                  session: "ScanSession") -> HostFeed:
+    """
+    Start probing the --discovery-ports of every host; return the hosts that answer, as they answer.
+
+    The scan takes hosts from the feed while discovery goes on, each
+    with its share of the concurrency (see split_concurrency). Dropped
+    hosts are recorded in the --store scan, so a diff shows their open
+    ports as no longer open.
+    """
+    timeout = min(args.discovery_timeout, args.timeout)
+    print(f"{Fore.CYAN}Discovering live hosts on ports {','.join(map(str, args.discovery_ports))} "
+          f"with {concurrency} {args.engine} connects ({timeout}s timeout); "
+          f"hosts are scanned as they answer{Style.RESET_ALL}")
+    start_time = time.time()
+
+    def on_finish(live: int) -> None:
+        print(f"{Fore.GREEN}[+] Discovery done: {live} hosts up ({time.time() - start_time:.2f} seconds); "
+              f"the rest are skipped - use --skip-discovery to scan every host{Style.RESET_ALL}")
+
+    on_down = session.store_sink.host_down if session.store_sink is not None else None
+    return discover_hosts(hosts, args.discovery_ports, timeout, args.engine, concurrency,
+                          timeout_policy, rate, governor, on_down=on_down, on_finish=on_finish)
+
+
+def parse_listen_address(value: str):
+    """Split --coordinator [HOST:]PORT into (host, port)."""
+    host, _, port = value.rpartition(':')
+    if not port.isdigit() or int(port) > 65535:
+        raise ValueError(f"Invalid --coordinator address: {value}")
+    return host.strip('[]') or '127.0.0.1', int(port)
+
+
+def run_worker_node(args) -> int:
+    """Scan leases for the --worker coordinator until its scan is finished."""
+    from distributed import run_worker
+
+    def on_lease(lease_id: int, hosts: int, probes: int) -> None:
+        print(f"{Fore.GREEN}[+] Lease {lease_id}: {probes} probes on {hosts} hosts reported{Style.RESET_ALL}")
+
+    print(f"{Fore.YELLOW}[>] Working for {Fore.CYAN}{args.worker}{Style.RESET_ALL}")
+    try:
+        leases = run_worker(args.worker, token=args.cluster_token, on_lease=on_lease)
+    except OSError as exc:
+        print(f"{Fore.RED}[!] {exc}{Style.RESET_ALL}")
+        return 1
+    except KeyboardInterrupt:
+        print(f"\n{Fore.RED}[!] Worker stopped by user{Style.RESET_ALL}")
+        return 1
+    print(f"{Fore.GREEN}[+] Scan finished; {leases} leases scanned by this worker{Style.RESET_ALL}")
+    return 0
+
+
+def build_sink(args):
+    """Open the -oJ/-oC/-oB output files, if any, as a single sink."""
+    # A resumed scan appends to the output of the run it continues
+    append = bool(args.resume)
+    sinks = []
+    if args.output_json:
+        sinks.append(JsonLinesSink(args.output_json, append))
+    if args.output_csv:
+        sinks.append(CsvSink(args.output_csv, append))
+    if args.output_binary:
+        sinks.append(BinarySink(args.output_binary, append))
+    if not sinks:
+        return None
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
+
+
+def list_scans(path: str) -> int:
+    """Print the scans recorded in a scan store (--list-scans)."""
+    from scan_store import ScanStore
+    store = ScanStore(path)
+    try:
+        scans = store.scans()
+    finally:
+        store.close()
+    if not scans:
+        print(f"{Fore.YELLOW}No scans recorded in {path}{Style.RESET_ALL}")
+        return 0
+    for scan in scans:
+        state = "" if scan.finished_at else f" {Fore.YELLOW}(unfinished){Style.RESET_ALL}"
+        print(f"{Fore.CYAN}{scan.describe()}{Style.RESET_ALL} {scan.targets or ''} "
+              f"- {scan.port_count} ports{state}")
+    return 0
+
+
+def print_scan_diff(store: "ScanStore", base: "StoredScan", scan_id: int) -> None:
+    """Report ports that opened or are no longer open since the --diff-against scan."""
+    print(f"\n{Fore.CYAN}Changes since scan {base.describe()}:{Style.RESET_ALL}")
+    counts = {'opened': 0, 'closed': 0}
+    for change in store.diff(base.id, scan_id):
+        counts[change.change] += 1
+        detail = change.service or 'UNKNOWN'
+        if change.banner:
+            detail += f" {change.banner}"
+        if change.change == 'opened':
+            print(f"  {Fore.GREEN}[+] {change.host}:{change.port}{Style.RESET_ALL} opened ({detail})")
+        else:
+            print(f"  {Fore.RED}[-] {change.host}:{change.port}{Style.RESET_ALL} no longer open ({detail})")
+    if not counts['opened'] and not counts['closed']:
+        print(f"  {Fore.WHITE}No open ports changed{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.WHITE}{counts['opened']} opened, {counts['closed']} no longer open{Style.RESET_ALL}")
+
+
+class ScanSession:
+    """
+    Objects that live for one CLI run: output sinks, checkpoint state, the
+    scan store, the fingerprinting stage, live metrics and the profiler.
+    
+    Created before the scan starts, so an interrupted run can still flush
+    its output files and save a checkpoint.
+    """
+    
+    def __init__(self, args):
+        self.args = args
+        self.sink = build_sink(args)
+        self.fingerprinter = None
+        if args.fingerprint:
+            self.fingerprinter = Fingerprinter(args.fingerprint_concurrency, args.fingerprint_timeout)
+        self.checkpoint = None
+        self.resume = None
+        
+        self.store = None
+        self.store_sink = None
+        self.scan_id = None
+        self.diff_base = None
+        self.completed = False
+        if args.store:
+            from scan_store import ScanStore
+            self.store = ScanStore(args.store)
+            # Resolved up front, so a wrong reference fails before scanning
+            if args.diff_against:
+                self.diff_base = self.store.find(args.diff_against)
+        
+        self.coordinator = None
+        if args.coordinator:
+            from distributed import Coordinator
+            host, port = parse_listen_address(args.coordinator)
+            self.coordinator = Coordinator(port, host, args.lease_timeout, args.cluster_token)
+            print(f"{Fore.GREEN}[+] Coordinator listening at {self.coordinator.url} - start workers "
+                  f"with: portspy --worker {self.coordinator.url}{Style.RESET_ALL}")
+        
+        self.metrics = None
+        self.metrics_server = None
+        self.stats_reporter = None
+        if args.metrics_port is not None or args.stats_interval:
+            self.metrics = ScanMetrics()
+        if args.metrics_port is not None:
+            self.metrics_server = MetricsServer(self.metrics, args.metrics_port)
+            host, port = self.metrics_server.address[:2]
+            print(f"{Fore.GREEN}[+] Metrics at http://{host}:{port}/metrics{Style.RESET_ALL}")
+        if args.stats_interval:
+            self.stats_reporter = StatsReporter(self.metrics, args.stats_interval)
+        
+        self.profiler = SamplingProfiler().start() if args.profile or args.profile_output else None
+    
+    def prepare(self, ports: List[int]) -> None:
+        """Load --resume state and set up --checkpoint once the port list is known."""
+        if self.args.resume:
+            self.resume = ResumeState(self.args.resume, ports)
+        checkpoint_path = self.args.checkpoint or self.args.resume
+        if checkpoint_path:
+            self.checkpoint = Checkpoint(checkpoint_path, ports, self.args.checkpoint_interval)
+        if self.store is not None:
+            targets = self.args.target or (f"-iL {self.args.input_list}" if self.args.input_list else None)
+            self.scan_id = self.store.begin(ports, self.args.label, targets, resume=bool(self.args.resume))
+            self.store_sink = self.store.sink(self.scan_id)
+            if self.sink is None:
+                self.sink = self.store_sink
+            elif isinstance(self.sink, MultiSink):
+                self.sink.sinks.append(self.store_sink)
+            else:
+                self.sink = MultiSink([self.sink, self.store_sink])
+    
+    def interrupted(self) -> None:
+        """Save progress after Ctrl+C so the scan can be resumed."""
+        if self.checkpoint is None:
+            return
+        self.checkpoint.save()
+        print(f"{Fore.YELLOW}[!] Progress saved to {self.checkpoint.path} - "
+              f"rerun the same command with --resume {self.checkpoint.path} to continue{Style.RESET_ALL}")
+    
+    def close(self) -> bool:
+        """
+        Flush the output and shut everything down, each part even if an earlier one fails.
+        
+        Returns:
+            bool: False if anything failed; each failure is printed as an error
+        """
+        failed = False
+        
+        def attempt(what: str, action) -> None:
+            nonlocal failed
+            try:
+                action()
+            except Exception as exc:
+                failed = True
+                print(f"{Fore.RED}[!] Error {what}: {exc}{Style.RESET_ALL}")
+        
+        # Fingerprinted ports are written to the sink, so finish them first
+        if self.fingerprinter is not None:
+            attempt("fingerprinting", self.fingerprinter.close)
+        if self.sink is not None:
+            attempt("writing output", self.sink.close)
+        if self.store is not None:
+            attempt("updating the scan store", self._close_store)
+        if self.coordinator is not None:
+            attempt("stopping the coordinator", self.coordinator.close)
+        if self.stats_reporter is not None:
+            attempt("reporting stats", self._close_stats)
+        if self.metrics_server is not None:
+            attempt("stopping the metrics server", self.metrics_server.close)
+        if self.profiler is not None:
+            attempt("profiling", self._close_profiler)
+        return not failed
+    
+    def _close_store(self) -> None:
+        try:
+            # A scan whose results did not all reach the store stays unfinished
+            if self.completed and self.scan_id is not None and self.store_sink.error is None:
+                self.store.finish(self.scan_id)
+                if self.diff_base is not None:
+                    print_scan_diff(self.store, self.diff_base, self.scan_id)
+        finally:
+            self.store.close()
+    
+    def _close_stats(self) -> None:
+        self.stats_reporter.close()
+        print(self.metrics.stats_line(), file=sys.stderr)
+    
+    def _close_profiler(self) -> None:
+        self.profiler.stop()
+        print(self.profiler.report(), file=sys.stderr)
+        if self.args.profile_output:
+            self.profiler.write_collapsed(self.args.profile_output)
+
+
+def run_scan(args, hosts: Iterable[str], ports: List[int], session: ScanSession) -> Dict[str, HostResults]:
+    """
+    Run the engine selected on the command line over hosts.
+    
+    Unless --skip-discovery is given, hosts first go through host
+    discovery and only those that answer are scanned. The report only
+    lists open ports and counts the rest, so closed ports are counted
+    without keeping a record for each one.
+    """
+    session.prepare(ports)
+    # A coordinator opens no probe sockets; each worker budgets its own
+    governor = None if args.coordinator else build_resource_governor(args)
+
+    concurrency = args.concurrency if args.engine in ('async', 'syn') else args.threads
+    if governor is not None and args.engine != 'syn' and governor.cap(concurrency) < concurrency:
+        concurrency = governor.cap(concurrency)
+        print(f"{Fore.YELLOW}[!] Limiting to {concurrency} concurrent connects "
+              f"({governor.describe()}){Style.RESET_ALL}")
+
+    timeout_policy = build_timeout_policy(args)
+    rate = build_rate_controller(args)
+    # Only worth it when the scan probes more ports than discovery does;
+    # the coordinator leaves all probing to its workers
+    feed = None
+    if not args.skip_discovery and not args.coordinator and len(ports) > len(args.discovery_ports):
+        discovery_concurrency, concurrency = split_concurrency(concurrency)
+        hosts = feed = run_discovery(args, hosts, discovery_concurrency, timeout_policy, rate, governor,
+                                     session)
+
+    if args.coordinator:
+        print(f"{Fore.CYAN}Distributing {len(ports)} ports per host to workers, each running "
+              f"{concurrency} {args.engine} connects...{Style.RESET_ALL}")
+    elif args.workers > 1:
+        print(f"{Fore.CYAN}Scanning {len(ports)} ports per host with {args.workers} worker processes "
+              f"x {concurrency} {args.engine} connects...{Style.RESET_ALL}")
+    elif args.engine == 'async':
+        print(f"{Fore.CYAN}Scanning {len(ports)} ports per host with up to "
+              f"{concurrency} concurrent connects...{Style.RESET_ALL}")
+    elif args.engine == 'syn':
+        print(f"{Fore.CYAN}SYN scanning {len(ports)} ports per host with up to "
+              f"{concurrency} probes awaiting replies...{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.CYAN}Scanning {len(ports)} ports per host with {concurrency} threads...{Style.RESET_ALL}")
+
+    console = ConsoleReporter(show_progress=not args.no_progress)
+    scanner = Scanner(
+        ports=ports,
+        timeout=args.timeout,
+        engine=args.engine,
+        concurrency=concurrency,
+        workers=args.workers,
+        timeout_policy=timeout_policy,
+        rate=rate,
+        retries=build_retry_queue(args),
+        keep_closed=False,
+        sink=session.sink,
+        checkpoint=session.checkpoint,
+        resume=session.resume,
+        fingerprinter=session.fingerprinter,
+        metrics=session.metrics,
+        services_file=services_file_path(args),
+        on_open=console.on_open,
+        on_progress=console.on_progress,
+        priority=session.store.priority() if args.delta else None,
+        governor=governor,
+        coordinator=session.coordinator
+    )
+    try:
+        results = scanner.run(hosts)
+    finally:
+        console.close()
+        if feed is not None:
+            feed.close()  # Stops discovery if the scan ended early
+    session.completed = True
+    return results
+
+
+def build_port_list(args, ports_input: str) -> List[int]:
+    """Parse the port specification and put it in the requested scan order."""
+    return list(PortSet.from_spec(ports_input).ordered(args.port_order, args.seed))
+
+
+def resolved_hosts(args, targets: Iterable[str], labels: Dict[str, str]) -> Iterator[str]:
+    """Resolve targets lazily, reporting failures and remembering each IP's original name."""
+    resolver = Resolver(max_workers=args.dns_workers)
+    for target, ip, message in resolve_targets(targets, resolver, IP_VERSIONS[args.ip_version]):
+        if not ip:
+            print(f"{Fore.RED}[X] Skipping {target}: {message}{Style.RESET_ALL}")
+            continue
+        labels[ip] = target
+        yield ip
+
+
+def scan_multiple_targets(args, targets: Iterable[str], ports_input: str, session: ScanSession) -> int:
+    """Scan several targets with interleaved scheduling and print a report per live host."""
+    print(f"\n{Fore.YELLOW}[>] Parsing ports: {Fore.CYAN}{ports_input}{Style.RESET_ALL}")
+    ports = build_port_list(args, ports_input)
+    print(f"{Fore.GREEN}[+] Will scan {Fore.YELLOW}{len(ports)}{Style.RESET_ALL} ports per host")
+    
+    if args.verbose:
+        print(f"{Fore.WHITE}Port list: {sorted(ports)}{Style.RESET_ALL}")
+    
+    labels = {}
+    hosts = resolved_hosts(args, targets, labels)
+    
+    print(f"\n{Fore.YELLOW}[>] Starting multi-target TCP scan...{Style.RESET_ALL}")
+    print(f"{Fore.CYAN}{'-' * 50}{Style.RESET_ALL}")
+    
+    start_time = time.time()
+    results_by_host = run_scan(args, hosts, ports, session)
+    scan_time = time.time() - start_time
+    
+    hosts_with_open = 0
+    # family name -> [hosts scanned, hosts with open ports, open ports]
+    family_totals = {}
+    for ip, results in results_by_host.items():
+        totals = family_totals.setdefault(family_name(ip), [0, 0, 0])
+        totals[0] += 1
+        if not results.count('open'):
+            continue
+        totals[1] += 1
+        totals[2] += results.count('open')
+        hosts_with_open += 1
+        print()
+        print(format_scan_results(
+            target=f"{labels.get(ip, ip)} ({ip})",
+            results=results,
+            scan_time=scan_time,
+            counts=results.status_counts()
+        ))
+    
+    print(f"\n{Fore.WHITE}Scanned {Fore.YELLOW}{len(results_by_host)}{Style.RESET_ALL} hosts "
+          f"in {Fore.GREEN}{scan_time:.2f}{Style.RESET_ALL} seconds, "
+          f"{Fore.GREEN}{hosts_with_open}{Style.RESET_ALL} with open ports")
+    if len(family_totals) > 1 or args.ip_version != '4':
+        for family, (hosts, open_hosts, open_ports) in sorted(family_totals.items()):
+            print(f"  {Fore.CYAN}{family}{Style.RESET_ALL}: {hosts} hosts, "
+                  f"{Fore.GREEN}{open_hosts}{Style.RESET_ALL} with open ports, "
+                  f"{Fore.GREEN}{open_ports}{Style.RESET_ALL} open ports")
+    
+    return 0 if hosts_with_open else 1
+
+
 def main():
     """Main entry point for the PortSpy application."""
+    # Checked before argparse runs, since the banner and help text are colored
+    if '--no-color' in sys.argv[1:]:
+        set_color(False)
+
     # Print colorful banner
     print(f"\n{Fore.CYAN}{Back.BLUE}  PortSpy - TCP Port Scanner  {Style.RESET_ALL}")
     print(f"{Fore.CYAN}{'='*40}{Style.RESET_ALL}")
@@ -65,19 +519,56 @@ def main():
   {Fore.CYAN}%(prog)s google.com -p 80,443{Style.RESET_ALL}          - Full command line
   {Fore.CYAN}%(prog)s 192.168.1.1 -p 80,443,22{Style.RESET_ALL}     - IP with ports
   {Fore.CYAN}%(prog)s example.com -p 80-85,443,8080{Style.RESET_ALL} - Port ranges
+  {Fore.CYAN}%(prog)s 10.0.0.0/24 -p 22,80{Style.RESET_ALL}          - Whole subnet
+  {Fore.CYAN}%(prog)s -iL targets.txt -p 443{Style.RESET_ALL}        - Targets from a file
+  {Fore.CYAN}%(prog)s example.com --ip-version both{Style.RESET_ALL}  - IPv4 and IPv6 addresses
+  {Fore.CYAN}%(prog)s 10.0.0.5 -p top1000 --port-order random{Style.RESET_ALL} - Top ports, shuffled
         """
     )
     
     parser.add_argument(
         'target',
         nargs='?',  # Make target optional
-        help='Target hostname or IP address to scan (optional - will prompt if not provided)'
+        help='Target(s) to scan: hostname, IP, CIDR block (10.0.0.0/24), range '
+             '(10.0.0.1-254) or a comma list (optional - will prompt if not provided)'
+    )
+    
+    parser.add_argument(
+        '-iL', '--input-list',
+        dest='input_list',
+        metavar='FILE',
+        help='Read targets from a file, one specification per line'
     )
     
     parser.add_argument(
         '-p', '--ports',
         help='Ports to scan (optional - will prompt if not provided). '
-             'Examples: "80,443", "80-90", "80,443,8000-8010"'
+             'Examples: "80,443", "80-90", "80,443,8000-8010", "top100", '
+             '"top1000,8000-8100", "all"'
+    )
+    
+    parser.add_argument(
+        '--port-order',
+        choices=PORT_ORDERS,
+        default='sequential',
+        help='Order to probe ports in: "sequential" (named sets most likely '
+             'first, then ascending), "random" or "stratified" (spread across '
+             'the whole range) (default: sequential)'
+    )
+    
+    parser.add_argument(
+        '--seed',
+        type=int,
+        help='Seed for --port-order random, to repeat a scan order'
+    )
+    
+    parser.add_argument(
+        '--ip-version',
+        choices=list(IP_VERSIONS),
+        default='4',
+        help='Address family hostnames are resolved to: "4", "6", or "both" to '
+             'scan every IPv4 and IPv6 address of a host in one run (default: 4). '
+             'IP addresses and ranges are scanned in their own family'
     )
     
     parser.add_argument(
@@ -87,6 +578,69 @@ def main():
         help='Number of threads to use (default: 50)'
     )
     
+    parser.add_argument(
+        '--engine',
+        choices=['thread', 'async', 'syn'],
+        default='thread',
+        help='Scan engine: "thread" uses a thread pool, "async" uses a single '
+             'asyncio event loop, "syn" sends half-open SYN probes from a raw '
+             'socket and needs root or CAP_NET_RAW (default: thread)'
+    )
+    
+    parser.add_argument(
+        '-sS', '--syn',
+        dest='engine',
+        action='store_const',
+        const='syn',
+        help='Same as --engine syn'
+    )
+    
+    parser.add_argument(
+        '-c', '--concurrency',
+        type=int,
+        default=500,
+        help='Maximum concurrent connects for the async engine, or SYN probes '
+             'awaiting a reply for the syn engine (default: 500)'
+    )
+    
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes; the scan is split into shards that '
+             'run the selected engine in parallel processes (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--coordinator',
+        metavar='[HOST:]PORT',
+        help='Distribute the scan: listen on HOST:PORT (127.0.0.1 if HOST is '
+             'omitted) and hand out leases to --worker processes, which scan '
+             'with this command\'s engine and settings'
+    )
+    
+    parser.add_argument(
+        '--worker',
+        metavar='URL',
+        help='Run as a worker for the coordinator at URL (e.g. http://10.0.0.5:7878) '
+             'until its scan is finished; no target or ports are needed'
+    )
+    
+    parser.add_argument(
+        '--lease-timeout',
+        type=float,
+        default=60.0,
+        metavar='SECONDS',
+        help='Seconds a worker may go without renewing its lease before the '
+             'coordinator gives the work to another worker (default: 60)'
+    )
+    
+    parser.add_argument(
+        '--cluster-token',
+        metavar='TOKEN',
+        help='Shared secret the coordinator requires from workers'
+    )
+    
     parser.add_argument(
         '--timeout',
         type=float,
@@ -94,6 +648,198 @@ def main():
         help='Connection timeout in seconds (default: 2.0)'
     )
     
+    parser.add_argument(
+        '--skip-discovery',
+        action='store_true',
+        help='Scan every target instead of only hosts that answer the discovery '
+             'probes (a few ports with a short timeout; an open port or a reset '
+             'means the host is up)'
+    )
+    
+    parser.add_argument(
+        '--discovery-ports',
+        default=','.join(map(str, DISCOVERY_PORTS)),
+        metavar='PORTS',
+        help='Ports probed on every host to find live ones (default: %(default)s)'
+    )
+    
+    parser.add_argument(
+        '--discovery-timeout',
+        type=float,
+        default=0.5,
+        metavar='SECONDS',
+        help='Timeout of discovery probes, at most --timeout (default: 0.5)'
+    )
+    
+    parser.add_argument(
+        '--max-rate',
+        type=float,
+        help='Maximum probes per second; the rate backs off automatically '
+             'when timeouts spike (default: unlimited)'
+    )
+    
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=0,
+        help='Re-probe filtered ports up to this many times (default: 0)'
+    )
+    
+    parser.add_argument(
+        '--adaptive-timeout',
+        action='store_true',
+        help='Derive per-host timeouts from measured RTT instead of always '
+             'waiting the full --timeout (which is used until replies arrive)'
+    )
+    
+    parser.add_argument(
+        '--min-timeout',
+        type=float,
+        default=0.05,
+        help='Lower bound for adaptive timeouts in seconds (default: 0.05)'
+    )
+    
+    parser.add_argument(
+        '--max-timeout',
+        type=float,
+        help='Upper bound for adaptive timeouts in seconds; timeouts start at '
+             '--timeout and grow up to this on slow hosts (default: 2 x --timeout)'
+    )
+    
+    parser.add_argument(
+        '--dns-workers',
+        type=int,
+        default=32,
+        help='Hostnames resolved concurrently when scanning several targets (default: 32)'
+    )
+    
+    parser.add_argument(
+        '-sV', '--fingerprint',
+        action='store_true',
+        help='Identify the service on each open port from its banner and '
+             'replies to HTTP and TLS probes, alongside the scan'
+    )
+    
+    parser.add_argument(
+        '--fingerprint-concurrency',
+        type=int,
+        default=20,
+        help='Open ports fingerprinted at the same time (default: 20)'
+    )
+    
+    parser.add_argument(
+        '--fingerprint-timeout',
+        type=float,
+        default=1.0,
+        help='Seconds to wait for each fingerprinting response (default: 1.0)'
+    )
+    
+    parser.add_argument(
+        '--services-file',
+        metavar='FILE',
+        help='Read service names from FILE instead of the system database; '
+             'use "bundled" for the copy shipped with PortSpy'
+    )
+    
+    parser.add_argument(
+        '-oJ',
+        dest='output_json',
+        metavar='FILE',
+        help='Stream results to FILE as JSON Lines'
+    )
+    
+    parser.add_argument(
+        '-oC',
+        dest='output_csv',
+        metavar='FILE',
+        help='Stream results to FILE as CSV'
+    )
+    
+    parser.add_argument(
+        '-oB',
+        dest='output_binary',
+        metavar='FILE',
+        help='Stream results to FILE in the compact PortSpy binary format'
+    )
+    
+    parser.add_argument(
+        '--checkpoint',
+        metavar='FILE',
+        help='Periodically save completed probes to FILE so the scan can be resumed'
+    )
+    
+    parser.add_argument(
+        '--checkpoint-interval',
+        type=float,
+        default=30.0,
+        metavar='SECONDS',
+        help='Seconds between checkpoint saves (default: 30)'
+    )
+    
+    parser.add_argument(
+        '--resume',
+        metavar='FILE',
+        help='Skip probes already completed in checkpoint FILE and keep '
+             'checkpointing to it; use the same targets and ports as the original run'
+    )
+    
+    parser.add_argument(
+        '--store',
+        metavar='FILE',
+        help='Record the scan in the SQLite scan history FILE (created if missing)'
+    )
+    
+    parser.add_argument(
+        '--label',
+        help='Name stored with the scan, e.g. "nightly"; --diff-against accepts it'
+    )
+    
+    parser.add_argument(
+        '--diff-against',
+        metavar='SCAN',
+        help='After the scan, report ports opened or no longer open since a stored '
+             'scan: its id, its label (latest run) or "last"; needs --store'
+    )
+    
+    parser.add_argument(
+        '--delta',
+        action='store_true',
+        help='Probe ports open in the last 5 stored scans first (changed ones '
+             'before stable ones), then the rest; needs --store'
+    )
+    
+    parser.add_argument(
+        '--list-scans',
+        action='store_true',
+        help='List the scans recorded in --store and exit'
+    )
+    
+    parser.add_argument(
+        '--metrics-port',
+        type=int,
+        metavar='PORT',
+        help='Serve live Prometheus-style metrics at http://127.0.0.1:PORT/metrics during the scan'
+    )
+    
+    parser.add_argument(
+        '--stats-interval',
+        type=float,
+        metavar='SECONDS',
+        help='Print a live stats line to stderr every SECONDS'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Sample every thread during the scan and print the hot spots to stderr'
+    )
+    
+    parser.add_argument(
+        '--profile-output',
+        metavar='FILE',
+        help='With profiling, also write collapsed stacks to FILE (for flame graphs); implies --profile'
+    )
+    
     parser.add_argument(
         '-v', '--verbose',
         action='store_true',
@@ -106,15 +852,51 @@ def main():
         help='Disable progress bar'
     )
     
+    parser.add_argument(
+        '--no-color',
+        action='store_true',
+        help='Plain output without colors (also when NO_COLOR is set or stdout '
+             'is not a terminal)'
+    )
+    
     args = parser.parse_args()
+    if args.engine == 'syn':
+        if args.workers > 1:
+            parser.error("--syn runs in a single process; drop -w/--workers")
+        reason = syn_unavailable()
+        if reason:
+            parser.error(reason)
+    if not args.store and (args.diff_against or args.delta or args.list_scans or args.label):
+        parser.error("--diff-against, --delta, --list-scans and --label need --store")
+    if args.delta and args.workers > 1:
+        parser.error("--delta runs in a single process; drop -w/--workers")
+    # from_spec skips invalid parts, so junk shows up as an empty set
+    args.discovery_ports = tuple(PortSet.from_spec(args.discovery_ports).ascending())
+    if not args.discovery_ports:
+        parser.error("--discovery-ports: no valid ports given")
+    if args.coordinator:
+        if args.workers > 1 or args.engine == 'syn' or args.delta:
+            parser.error("--coordinator cannot be combined with -w/--workers, --syn or --delta")
+        try:
+            parse_listen_address(args.coordinator)
+        except ValueError as exc:
+            parser.error(str(exc))
+    if args.worker:
+        return run_worker_node(args)
+    if args.list_scans:
+        return list_scans(args.store)
+    session = None
     
     try:
+        # Build the port -> service table once, before any probe needs it
+        load_services(services_file_path(args))
+        
         # Handle interactive input if target or ports not provided
         target = args.target
         ports_input = args.ports
         
         # Interactive mode if no target provided
-        if not target:
+        if not target and not args.input_list:
             target, ports_input = get_user_input()
         # Semi-interactive mode if target provided but no ports
         elif not ports_input:
@@ -136,9 +918,25 @@ def main():
             if not ports_input:
                 ports_input = '80,443,22,21,25,53,110,995,993,143'
         
+        # Machine-readable output files are written while the scan runs
+        session = ScanSession(args)
+        
+        # Several targets (CIDR, ranges, lists, -iL) use the multi-target scheduler
+        if args.input_list:
+            return scan_multiple_targets(args, read_target_file(args.input_list), ports_input, session)
+        
+        targets = expand_targets(target)
+        first_targets = list(islice(targets, 2))
+        # A hostname scanned over both families may have several addresses
+        if len(first_targets) > 1 or (
+                args.ip_version == 'both' and first_targets and not is_valid_ip(first_targets[0])):
+            return scan_multiple_targets(args, chain(first_targets, targets), ports_input, session)
+        if first_targets:
+            target = first_targets[0]
+        
         # Step 1: Validate and resolve target
         print(f"\n{Fore.YELLOW}[>] Resolving target: {Fore.CYAN}{target}{Style.RESET_ALL}")
-        target_result = validate_target(target)
+        target_result = validate_target(target, IP_VERSIONS[args.ip_version])
         
         # Extract IP from the validation result
         if isinstance(target_result, tuple):
@@ -151,46 +949,57 @@ def main():
         
         # Step 2: Parse port specification
         print(f"\n{Fore.YELLOW}[>] Parsing ports: {Fore.CYAN}{ports_input}{Style.RESET_ALL}")
-        ports = parse_ports(ports_input)
+        ports = build_port_list(args, ports_input)
         print(f"{Fore.GREEN}[+] Will scan {Fore.YELLOW}{len(ports)}{Style.RESET_ALL} ports")
         
         if args.verbose:
             print(f"{Fore.WHITE}Port list: {sorted(ports)}{Style.RESET_ALL}")
         
         # Step 3: Perform the scan
-        print(f"\n{Fore.YELLOW}[>] Starting TCP scan with {Fore.CYAN}{args.threads}{Style.RESET_ALL} threads...")
+        if args.coordinator:
+            print(f"\n{Fore.YELLOW}[>] Starting distributed TCP scan, waiting for workers...{Style.RESET_ALL}")
+        elif args.workers > 1:
+            print(f"\n{Fore.YELLOW}[>] Starting sharded TCP scan with {Fore.CYAN}{args.workers}{Style.RESET_ALL} worker processes...")
+        elif args.engine == 'async':
+            print(f"\n{Fore.YELLOW}[>] Starting async TCP scan with {Fore.CYAN}{args.concurrency}{Style.RESET_ALL} concurrent connects...")
+        elif args.engine == 'syn':
+            print(f"\n{Fore.YELLOW}[>] Starting SYN scan with {Fore.CYAN}{args.concurrency}{Style.RESET_ALL} probes in flight...")
+        else:
+            print(f"\n{Fore.YELLOW}[>] Starting TCP scan with {Fore.CYAN}{args.threads}{Style.RESET_ALL} threads...")
         print(f"{Fore.CYAN}{'-' * 50}{Style.RESET_ALL}")
         
         start_time = time.time()
-        results = tcp_scan_ports(
-            ip=target_ip,
-            ports=ports,
-            max_threads=args.threads,
-            timeout=args.timeout,
-            show_progress=not args.no_progress
-        )
+        results = run_scan(args, [target_ip], ports, session).get(target_ip)
         scan_time = time.time() - start_time
         
         # Step 4: Display results
         print()  # Add some spacing
         report = format_scan_results(
             target=f"{target} ({target_ip})",
-            results=results,
-            scan_time=scan_time
+            results=results or [],
+            scan_time=scan_time,
+            counts=results.status_counts() if results is not None else {}
         )
         print(report)
         
         # Return different exit codes based on results
-        open_ports = [r for r in results if r['status'] == 'open']
-        return 0 if open_ports else 1
+        return 0 if results is not None and results.count('open') else 1
         
     except KeyboardInterrupt:
         print(f"\n{Fore.RED}[!] Scan interrupted by user{Style.RESET_ALL}")
+        if session is not None:
+            session.interrupted()
         return 1
         
     except Exception as e:
         print(f"{Fore.RED}[!] Error: {e}{Style.RESET_ALL}")
         return 1
+    
+    finally:
+        # Flush whatever was scanned, even after an interrupt; output that
+        # could not be written fails the run
+        if session is not None and not session.close():
+            return 1
 
 
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+import threading
+import time
+from typing import Optional
+
+
+class RateController:
+    """
+    Probe pacing with AIMD (additive increase, multiplicative decrease).
+
+    Probes are spaced 1/rate seconds apart. Results are counted in windows;
+    when the share of filtered/error results in a window jumps above the
+    scan's usual level (a sign of packet loss or IDS throttling rather than
+    a firewalled host), the rate is halved. Otherwise it creeps back up
+    toward max_rate by a fixed step per window.
+
+    Safe to share between threads; acquire_async must only be used from a
+    single event loop.
+
+    Args:
+        max_rate (float): Maximum probes per second
+        min_rate (float): Rate never drops below this (default: max_rate / 100)
+        window (int): Number of results per AIMD decision
+        spike (float): How far above the usual loss ratio counts as a spike
+    """
+
+    def __init__(self, max_rate: float, min_rate: Optional[float] = None,
+                 window: int = 100, spike: float = 0.2):
+        if max_rate <= 0:
+            raise ValueError("Maximum rate must be positive")
+        self.max_rate = max_rate
+        self.min_rate = min_rate or max(1.0, max_rate / 100)
+        self.rate = max_rate
+        self.window = window
+        self.spike = spike
+        self.increase = max(1.0, max_rate / 50)
+        self.baseline_loss: Optional[float] = None
+        self._next_slot = time.monotonic()
+        self._seen = 0
+        self._lost = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Claim the next send slot and return how long to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+            return slot - now
+
+    def acquire(self) -> None:
+        """Block the calling thread until the next probe may be sent."""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        """Wait on the event loop until the next probe may be sent."""
+        import asyncio
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record(self, status: str) -> None:
+        """Count a finished probe and adjust the rate at the end of each window."""
+        with self._lock:
+            self._seen += 1
+            if status in ('filtered', 'error'):
+                self._lost += 1
+            if self._seen < self.window:
+                return
+
+            loss = self._lost / self._seen
+            self._seen = self._lost = 0
+
+            if self.baseline_loss is None:
+                self.baseline_loss = loss
+
+            if loss > self.baseline_loss + self.spike:
+                self.rate = max(self.min_rate, self.rate / 2)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+            # The usual level follows slowly, so a sustained change stops counting as a spike
+            self.baseline_loss = 0.9 * self.baseline_loss + 0.1 * loss
@@ -0,0 +1,130 @@
+import errno
+import os
+import threading
+from typing import Dict, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows has no rlimits
+    resource = None
+
+# Errors that come from this machine running out of something (descriptors,
+# buffers, ephemeral ports), not from the target; such a probe says nothing
+# about the port and is sent again
+LOCAL_RESOURCE_ERRNOS = frozenset((
+    errno.EMFILE,
+    errno.ENFILE,
+    errno.ENOBUFS,
+    errno.ENOMEM,
+    errno.EADDRNOTAVAIL,
+    errno.EAGAIN,
+))
+
+# Largest soft limit requested when the hard limit is unlimited
+_UNLIMITED_TARGET = 1 << 20
+
+
+def raise_fd_limit() -> Tuple[int, int]:
+    """
+    Raise the soft RLIMIT_NOFILE to the hard limit where allowed.
+
+    Returns:
+        (soft, hard) limits in effect afterwards; (0, 0) where rlimits do
+        not exist
+    """
+    if resource is None:
+        return (0, 0)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = hard if hard != resource.RLIM_INFINITY else _UNLIMITED_TARGET
+    if soft != resource.RLIM_INFINITY and soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        except (ValueError, OSError):
+            pass  # e.g. macOS caps descriptors below the hard limit
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    return (soft, hard)
+
+
+def open_fd_count() -> int:
+    """Descriptors this process has open now (0 where it cannot be told)."""
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return 0
+
+
+class ResourceGovernor:
+    """
+    Keeps a scan within the process's file descriptor budget.
+
+    On creation it raises RLIMIT_NOFILE as far as allowed and works out
+    how many probe sockets may be open at once: the limit, minus the
+    descriptors already open, minus reserve for everything else (output
+    files, DNS lookups, fingerprinting connects). The engines cap their
+    concurrency with cap().
+
+    Probes that still fail for local reasons (LOCAL_RESOURCE_ERRNOS, e.g.
+    EMFILE from another part of the process or EADDRNOTAVAIL when
+    ephemeral ports run out) are sent again instead of being reported as
+    errors: requeue() says whether to, and pause() how long the failing
+    worker should back off first, doubling while failures continue.
+
+    Args:
+        reserve (int): Descriptors kept free for things other than probes
+        max_requeues (int): Times a single probe is sent again before its
+            error is reported
+    """
+
+    def __init__(self, reserve: int = 64, max_requeues: int = 8):
+        self.soft_limit, self.hard_limit = raise_fd_limit()
+        self.reserve = reserve
+        self.max_requeues = max_requeues
+        self.socket_budget = None
+        if self.soft_limit:
+            self.socket_budget = max(1, self.soft_limit - open_fd_count() - reserve)
+        self.requeued = 0
+        self._requeues: Dict[Tuple[str, int], int] = {}
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def cap(self, concurrency: int) -> int:
+        """Limit a thread count or connect concurrency to the socket budget."""
+        if self.socket_budget is None:
+            return concurrency
+        return min(concurrency, self.socket_budget)
+
+    def requeue(self, host: str, port: int, result: Dict[str, any]) -> bool:
+        """
+        Return True if the probe failed for a local reason and should be sent again.
+
+        Successful and target-caused results reset the backoff.
+        """
+        key = (host, port)
+        with self._lock:
+            if result.get('errno') not in LOCAL_RESOURCE_ERRNOS:
+                self._failures = 0
+                if self._requeues:
+                    self._requeues.pop(key, None)
+                return False
+            self._failures += 1
+            count = self._requeues.get(key, 0)
+            if count >= self.max_requeues:
+                del self._requeues[key]
+                return False
+            self._requeues[key] = count + 1
+            self.requeued += 1
+            return True
+
+    def pause(self) -> float:
+        """Seconds a worker should wait after a local resource error."""
+        with self._lock:
+            failures = self._failures
+        return min(1.0, 0.005 * 2 ** min(failures, 8))
+
+    def describe(self) -> str:
+        """Short description for the console, e.g. "fd limit 20000, up to 19900 probe sockets"."""
+        if self.socket_budget is None:
+            return "no file descriptor limit available"
+        return f"fd limit {self.soft_limit}, up to {self.socket_budget} probe sockets"
@@ -0,0 +1,158 @@
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from service_map import identify_service
+from tcp_scanner import STATUS_CODES, STATUS_INDEX
+
+
+class ScanResult:
+    """
+    Compact scan result for one port.
+
+    Uses __slots__ instead of a per-port dict, but still supports
+    result['status'] style access so it can be used anywhere a result dict
+    from tcp_scan_port is expected. banner is set by the fingerprinting
+    stage (see fingerprint.py) and is None otherwise.
+    """
+
+    __slots__ = ('port', 'status', 'service', 'response_time', 'banner')
+
+    def __init__(self, port: int, status: str, service: str, response_time: float,
+                 banner: Optional[str] = None):
+        self.port = port
+        self.status = status
+        self.service = service
+        self.response_time = response_time
+        self.banner = banner
+
+    @classmethod
+    def from_dict(cls, result: Dict[str, any]) -> "ScanResult":
+        return cls(result['port'], result['status'], result['service'], result['response_time'],
+                   result.get('banner'))
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self) -> Dict[str, any]:
+        result = {
+            'port': self.port,
+            'status': self.status,
+            'service': self.service,
+            'response_time': self.response_time
+        }
+        if self.banner is not None:
+            result['banner'] = self.banner
+        return result
+
+    def __repr__(self) -> str:
+        return f"ScanResult({self.to_dict()!r})"
+
+
+class PortIndex:
+    """
+    Maps each scanned port to its position in a status table. Shared by all hosts of a scan.
+
+    Ports are kept in ascending order, so a status table means the same
+    thing whatever order the ports were probed in.
+    """
+
+    __slots__ = ('ports', 'positions')
+
+    def __init__(self, ports: Sequence[int]):
+        self.ports = sorted(ports)
+        self.positions = {port: i for i, port in enumerate(self.ports)}
+
+    def __len__(self) -> int:
+        return len(self.ports)
+
+
+class HostResults:
+    """
+    All results for one host, stored compactly.
+
+    Every port's state lives in a bytearray (one byte per scanned port,
+    0 = not scanned yet), and per-status counts are updated as results
+    arrive. Full ScanResult records are kept only for ports that are not
+    closed, unless keep_closed is set, so memory tracks the interesting
+    ports rather than the size of the sweep.
+
+    Iterating yields the kept records in port order.
+    """
+
+    __slots__ = ('index', 'statuses', 'counts', 'kept', 'keep_closed', '_sorted')
+
+    def __init__(self, index: PortIndex, keep_closed: bool = True):
+        self.index = index
+        self.statuses = bytearray(len(index))
+        self.counts = [0] * len(STATUS_CODES)
+        self.kept: List[ScanResult] = []
+        self.keep_closed = keep_closed
+        self._sorted = True
+
+    @classmethod
+    def from_statuses(cls, index: PortIndex, statuses: bytes, keep_closed: bool = True) -> "HostResults":
+        """
+        Rebuild results from a saved status table (see checkpoint.py).
+        
+        Response times are not saved, so restored records report 0.0.
+        """
+        host_results = cls(index, keep_closed)
+        for port, code in zip(index.ports, statuses):
+            if code:
+                host_results.add(ScanResult(port, STATUS_CODES[code], identify_service(port), 0.0))
+        return host_results
+
+    def add(self, result: Dict[str, any]) -> bool:
+        """
+        Record a result dict (or ScanResult) from the scan engine.
+
+        Returns:
+            bool: False if the port already had a result, which is kept
+        """
+        code = STATUS_INDEX.get(result['status'], 0)
+        position = self.index.positions.get(result['port'])
+        if position is not None:
+            if self.statuses[position]:
+                return False
+            self.statuses[position] = code
+        self.counts[code] += 1
+
+        if result['status'] != 'closed' or self.keep_closed:
+            record = result if isinstance(result, ScanResult) else ScanResult.from_dict(result)
+            if self.kept and self.kept[-1].port > record.port:
+                self._sorted = False
+            self.kept.append(record)
+        return True
+
+    def status(self, port: int) -> Optional[str]:
+        """Return the status of a port, or None if it has not been scanned."""
+        position = self.index.positions.get(port)
+        if position is None or not self.statuses[position]:
+            return None
+        return STATUS_CODES[self.statuses[position]]
+
+    def count(self, status: str) -> int:
+        return self.counts[STATUS_INDEX[status]]
+
+    def status_counts(self) -> Dict[str, int]:
+        """Return {status: count} for every status seen on this host."""
+        return {STATUS_CODES[code]: n for code, n in enumerate(self.counts) if n}
+
+    @property
+    def total(self) -> int:
+        """Number of ports scanned on this host."""
+        return sum(self.counts)
+
+    def __iter__(self) -> Iterator[ScanResult]:
+        if not self._sorted:
+            self.kept.sort(key=lambda r: r.port)
+            self._sorted = True
+        return iter(self.kept)
+
+    def __len__(self) -> int:
+        return len(self.kept)
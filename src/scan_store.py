@@ -0,0 +1,289 @@
+import sqlite3
+import time
+from typing import Callable, Dict, IO, Iterator, List, Optional, Tuple
+
+from output_sinks import ResultSink
+from port_parser import PortSet
+
+# Only open ports get a row per scan; every other status is just counted
+# per host, so a nightly sweep of a mostly closed network stays small.
+# A port that is not open in a scan that covered its host and port was
+# closed, filtered or otherwise unreachable.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    label TEXT,
+    targets TEXT,
+    port_count INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS scan_ports (
+    scan_id INTEGER NOT NULL,
+    first INTEGER NOT NULL,
+    last INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scan_ports_by_scan ON scan_ports (scan_id, first);
+CREATE TABLE IF NOT EXISTS scan_hosts (
+    scan_id INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    open INTEGER NOT NULL DEFAULT 0,
+    closed INTEGER NOT NULL DEFAULT 0,
+    filtered INTEGER NOT NULL DEFAULT 0,
+    other INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scan_id, host)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS results (
+    scan_id INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    service TEXT,
+    banner TEXT,
+    response_time REAL,
+    PRIMARY KEY (scan_id, host, port)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS results_by_host ON results (host, port, scan_id);
+"""
+
+# Ports open in scan :found but not in scan :other, limited to the hosts
+# and ports :other covered. With :found the newer scan these opened; with
+# :found the older one they are no longer open.
+_OPEN_ONLY_IN = """
+SELECT found.host, found.port, found.service, found.banner
+FROM results AS found
+JOIN scan_hosts AS covered ON covered.scan_id = :other AND covered.host = found.host
+WHERE found.scan_id = :found
+  AND EXISTS (SELECT 1 FROM scan_ports AS r
+              WHERE r.scan_id = :other AND found.port BETWEEN r.first AND r.last)
+  AND NOT EXISTS (SELECT 1 FROM results AS before
+                  WHERE before.scan_id = :other AND before.host = found.host AND before.port = found.port)
+ORDER BY found.host, found.port
+"""
+
+_PRIORITY = """
+SELECT host, port
+FROM results
+WHERE host IN ({hosts})
+  AND scan_id IN (SELECT id FROM scans WHERE finished_at IS NOT NULL ORDER BY id DESC LIMIT ?)
+GROUP BY host, port
+ORDER BY COUNT(*), MAX(scan_id) DESC
+"""
+
+# Columns of scan_hosts counted per status; anything else goes to "other"
+_COUNTED = ('open', 'closed', 'filtered')
+
+
+class StoredScan:
+    """One scan recorded in a ScanStore."""
+
+    __slots__ = ('id', 'label', 'targets', 'port_count', 'started_at', 'finished_at')
+
+    def __init__(self, id: int, label: Optional[str], targets: Optional[str], port_count: int,
+                 started_at: float, finished_at: Optional[float]):
+        self.id = id
+        self.label = label
+        self.targets = targets
+        self.port_count = port_count
+        self.started_at = started_at
+        self.finished_at = finished_at
+
+    def describe(self) -> str:
+        """Short description for reports, e.g. "#12 nightly (2026-10-16 02:00)"."""
+        started = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.started_at))
+        label = f" {self.label}" if self.label else ""
+        return f"#{self.id}{label} ({started})"
+
+
+class PortChange:
+    """A port that opened or is no longer open between two scans."""
+
+    __slots__ = ('host', 'port', 'change', 'service', 'banner')
+
+    def __init__(self, host: str, port: int, change: str, service: Optional[str],
+                 banner: Optional[str]):
+        self.host = host
+        self.port = port
+        self.change = change
+        self.service = service
+        self.banner = banner
+
+    def __repr__(self) -> str:
+        return f"PortChange({self.host!r}, {self.port}, {self.change!r})"
+
+
+class ScanStore:
+    """
+    History of scans in a local SQLite database.
+
+    Each scan records its port ranges, the hosts it covered with a count
+    per status, and a row per open port (with service and banner). That
+    is enough to tell, for any two scans, which ports opened and which
+    are no longer open, without keeping closed ports. Diffs and delta
+    priorities are SQL queries over indexed tables, so history is never
+    loaded into memory.
+
+    Results are written by StoreSink on its own connection; the database
+    uses WAL mode so reads and that writer do not block each other.
+
+    Args:
+        path (str): Database file, created if missing
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Used by the engine thread for delta priorities, one thread at a time
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    def begin(self, ports: List[int], label: Optional[str] = None, targets: Optional[str] = None,
+              resume: bool = False) -> int:
+        """
+        Record the start of a scan and return its id.
+
+        With resume, the most recent unfinished scan with the same label,
+        targets and port ranges is continued instead, if there is one, so
+        a resumed run never adds to an unrelated crashed scan.
+        """
+        intervals = PortSet((port, port) for port in ports).intervals
+        if resume:
+            candidates = self._db.execute(
+                "SELECT id FROM scans WHERE finished_at IS NULL AND label IS ? AND targets IS ? "
+                "AND port_count = ? ORDER BY id DESC", (label, targets, len(ports)))
+            for (scan_id,) in candidates.fetchall():
+                stored = self._db.execute(
+                    "SELECT first, last FROM scan_ports WHERE scan_id = ? ORDER BY first", (scan_id,))
+                if [tuple(row) for row in stored] == intervals:
+                    return scan_id
+        with self._db:
+            scan_id = self._db.execute(
+                "INSERT INTO scans (label, targets, port_count, started_at) VALUES (?, ?, ?, ?)",
+                (label, targets, len(ports), time.time())).lastrowid
+            self._db.executemany(
+                "INSERT INTO scan_ports (scan_id, first, last) VALUES (?, ?, ?)",
+                ((scan_id, first, last) for first, last in intervals))
+        return scan_id
+
+    def finish(self, scan_id: int) -> None:
+        """Mark a scan complete; only complete scans are diffed against or used for delta scans."""
+        with self._db:
+            self._db.execute("UPDATE scans SET finished_at = ? WHERE id = ?", (time.time(), scan_id))
+
+    def sink(self, scan_id: int) -> "StoreSink":
+        """Return a sink that records results into scan_id."""
+        return StoreSink(self.path, scan_id)
+
+    def scans(self, limit: int = 20) -> List[StoredScan]:
+        """The most recent scans, newest first."""
+        rows = self._db.execute(
+            "SELECT id, label, targets, port_count, started_at, finished_at FROM scans "
+            "ORDER BY id DESC LIMIT ?", (limit,))
+        return [StoredScan(*row) for row in rows]
+
+    def find(self, reference: str) -> StoredScan:
+        """
+        Look up a finished scan by id, by label (its latest run) or "last".
+
+        Raises:
+            ValueError: If no finished scan matches
+        """
+        columns = "SELECT id, label, targets, port_count, started_at, finished_at FROM scans"
+        if reference == 'last':
+            row = self._db.execute(
+                f"{columns} WHERE finished_at IS NOT NULL ORDER BY id DESC LIMIT 1").fetchone()
+        elif reference.isdigit():
+            row = self._db.execute(
+                f"{columns} WHERE id = ? AND finished_at IS NOT NULL", (int(reference),)).fetchone()
+        else:
+            row = self._db.execute(
+                f"{columns} WHERE label = ? AND finished_at IS NOT NULL ORDER BY id DESC LIMIT 1",
+                (reference,)).fetchone()
+        if row is None:
+            raise ValueError(f"No finished scan matching {reference!r} in {self.path}")
+        return StoredScan(*row)
+
+    def diff(self, old_id: int, new_id: int) -> Iterator[PortChange]:
+        """
+        Yield ports that opened, then ports no longer open, from scan old_id to new_id.
+
+        Only hosts and ports covered by both scans are compared. Each list
+        is ordered by host and port and streamed from the database.
+        """
+        for found, other, change in ((new_id, old_id, 'opened'), (old_id, new_id, 'closed')):
+            for host, port, service, banner in self._db.execute(_OPEN_ONLY_IN, {'found': found, 'other': other}):
+                yield PortChange(host, port, change, service, banner)
+
+    def priority(self, history: int = 5) -> Callable[[List[str]], List[Tuple[str, int]]]:
+        """
+        Return a scheduler priority function for delta scans.
+
+        Given a window of hosts it returns the (host, port) pairs that were
+        open in any of the last history finished scans, ports that changed
+        (open in fewer of those scans) and recently opened ones first.
+        """
+        def open_before(hosts: List[str]) -> List[Tuple[str, int]]:
+            query = _PRIORITY.format(hosts=",".join("?" * len(hosts)))
+            return self._db.execute(query, (*hosts, history)).fetchall()
+        return open_before
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class StoreSink(ResultSink):
+    """
+    Records results into a ScanStore scan: open ports as rows, every result in its host's counts.
+
+    Each batch from the writer thread is one transaction.
+
+    Args:
+        path (str): ScanStore database file
+        scan_id (int): Scan the results belong to (see ScanStore.begin)
+    """
+
+    def __init__(self, path: str, scan_id: int):
+        self.scan_id = scan_id
+        super().__init__(path, append=True)
+
+    def _open(self, path: str) -> IO:
+        # The writer thread is the only user of this connection
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def host_down(self, host: str) -> None:
+        """
+        Queue a host that was covered but not scanned, e.g. dropped by host discovery.
+
+        It gets a scan_hosts row with zero counts, so diffs report the
+        ports it had open as no longer open.
+        """
+        self._queue.put((host, None))
+
+    def _write_batch(self, batch: List[Tuple[str, Optional[Dict[str, any]]]]) -> None:
+        counts: Dict[str, List[int]] = {}
+        opened = []
+        for host, r in batch:
+            host_counts = counts.get(host)
+            if host_counts is None:
+                host_counts = counts[host] = [0, 0, 0, 0]
+            if r is None:
+                continue  # host_down()
+            status = r['status']
+            host_counts[_COUNTED.index(status) if status in _COUNTED else 3] += 1
+            if status == 'open':
+                opened.append((self.scan_id, host, r['port'], r['service'], r.get('banner'),
+                               r['response_time']))
+
+        with self._handle:
+            self._handle.executemany(
+                "INSERT OR REPLACE INTO results (scan_id, host, port, service, banner, response_time) "
+                "VALUES (?, ?, ?, ?, ?, ?)", opened)
+            self._handle.executemany(
+                "INSERT INTO scan_hosts (scan_id, host, open, closed, filtered, other) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (scan_id, host) DO UPDATE SET "
+                "open = open + excluded.open, closed = closed + excluded.closed, "
+                "filtered = filtered + excluded.filtered, other = other + excluded.other",
+                ((self.scan_id, host, *host_counts) for host, host_counts in counts.items()))
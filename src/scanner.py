@@ -0,0 +1,294 @@
+import threading
+from queue import SimpleQueue
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from adaptive_timeout import AdaptiveTimeout
+from checkpoint import Checkpoint, ResumeState
+from fingerprint import Fingerprinter
+from metrics import ScanMetrics
+from output_sinks import ResultSink
+from rate_control import RateController
+from resource_governor import ResourceGovernor
+from results import HostResults, ScanResult
+from scheduler import RetryQueue, interleave_probes, run_async, run_threaded, _ScanState
+from syn_scanner import run_syn
+
+if TYPE_CHECKING:
+    from distributed import Coordinator
+
+ENGINES = ('thread', 'async', 'syn')
+
+# Default threads / connects / SYNs in flight per engine (per worker when sharded)
+_DEFAULT_CONCURRENCY = {'thread': 100, 'async': 500, 'syn': 1000}
+
+# Marks the end of the results passed from the event loop thread in scan()
+_END = object()
+
+
+class Scanner:
+    """
+    Port scanner for use as a library.
+
+    Configure once, then iterate scan(hosts) (or scan_async(hosts) inside
+    an event loop) to get (host, ScanResult) pairs as probes complete, in
+    completion order. Closed and filtered ports are yielded too; check
+    result.status. Once the iteration ends, or is stopped early, the full
+    results are in .results, per host in address order.
+
+    The on_open(host, result) and on_progress(done, open_count) callbacks
+    are called for every recorded result, on the thread running the
+    engine, before the result is yielded. The command line wires them to
+    tcp_scanner.ConsoleReporter.
+
+    Example:
+        >>> scanner = Scanner(ports=[22, 80, 443], timeout=1.0)
+        >>> for host, result in scanner.scan(["192.168.1.1", "192.168.1.2"]):
+        ...     if result.status == 'open':
+        ...         print(host, result.port, result.service)
+
+    Args:
+        ports (List[int]): Ports to scan on every host, in probe order
+        timeout (float): Connection timeout per port
+        engine (str): "thread" (thread pool), "async" (event loop) or "syn"
+            (raw-socket half-open probes; needs root or CAP_NET_RAW)
+        concurrency (int): Threads, concurrent connects or SYNs awaiting a
+            reply (per worker process when workers > 1); defaults to 100
+            threads, 500 connects or 1000 SYNs
+        workers (int): Worker processes; above 1 the scan is sharded (not
+            supported by the syn engine)
+        host_window (int): Hosts interleaved at a time (hosts per shard when
+            sharded); defaults to 256 (64 when sharded)
+        timeout_policy (AdaptiveTimeout): Optional per-host RTT-based timeouts
+        rate (RateController): Optional probes-per-second limit with AIMD backoff
+        retries (RetryQueue): Optional re-probing of 'filtered' results
+        keep_closed (bool): Keep records for closed ports in .results; when
+            False they are only counted (they are still yielded)
+        sink (ResultSink): Optional output written as each result arrives
+        checkpoint (Checkpoint): Optional periodic save of completed probes
+        resume (ResumeState): Completed probes to skip and restore
+        fingerprinter (Fingerprinter): Optional service fingerprinting of
+            open ports; results are yielded before their service is known
+        metrics (ScanMetrics): Optional live counters and latency histogram
+        services_file (str): Services file worker processes load (sharded only)
+        on_open (Callable): Called as on_open(host, result) for each open port
+        on_progress (Callable): Called as on_progress(done, open_count)
+        priority (Callable): Optional probes to send first in each host
+            window (see interleave_probes), e.g. ScanStore.priority() for
+            delta scans; not supported when sharded
+        governor (ResourceGovernor): Optional file descriptor budget; caps
+            concurrency of the connect engines below the descriptor limit
+            and re-queues probes that fail for lack of local resources
+            instead of reporting them as errors
+        coordinator (distributed.Coordinator): Optional; hand the scan out
+            as leases to distributed.run_worker processes instead of
+            scanning locally. Workers run the thread or async engine with
+            this scanner's settings (max_rate applies to each worker)
+
+    Sharded and distributed scans rebuild timeout_policy, rate and
+    retries inside each worker from their settings (bounds, max_rate,
+    max_retries, the governor's reserve).
+    """
+
+    def __init__(self, ports: List[int], timeout: float = 2.0, engine: str = 'thread',
+                 concurrency: Optional[int] = None, workers: int = 1,
+                 host_window: Optional[int] = None,
+                 timeout_policy: Optional[AdaptiveTimeout] = None,
+                 rate: Optional[RateController] = None,
+                 retries: Optional[RetryQueue] = None,
+                 keep_closed: bool = True,
+                 sink: Optional[ResultSink] = None,
+                 checkpoint: Optional[Checkpoint] = None,
+                 resume: Optional[ResumeState] = None,
+                 fingerprinter: Optional[Fingerprinter] = None,
+                 metrics: Optional[ScanMetrics] = None,
+                 services_file: Optional[str] = None,
+                 on_open: Optional[Callable[[str, ScanResult], None]] = None,
+                 on_progress: Optional[Callable[[int, int], None]] = None,
+                 priority: Optional[Callable[[List[str]], Iterable[Tuple[str, int]]]] = None,
+                 governor: Optional[ResourceGovernor] = None,
+                 coordinator: Optional["Coordinator"] = None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if engine == 'syn' and (workers > 1 or coordinator is not None):
+            raise ValueError("The syn engine runs in a single process")
+        if priority is not None and (workers > 1 or coordinator is not None):
+            raise ValueError("Probe priorities are not supported by sharded or distributed scans")
+        if coordinator is not None and workers > 1:
+            raise ValueError("Distributed scans run on the workers; drop workers")
+        self.ports = list(ports)
+        self.timeout = timeout
+        self.engine = engine
+        self.concurrency = concurrency or _DEFAULT_CONCURRENCY[engine]
+        if governor is not None and engine != 'syn':
+            # Each connect holds a descriptor; the syn engine shares two raw sockets
+            self.concurrency = governor.cap(self.concurrency)
+        self.workers = workers
+        self.host_window = host_window or (64 if workers > 1 or coordinator is not None else 256)
+        self.timeout_policy = timeout_policy
+        self.rate = rate
+        self.retries = retries
+        self.keep_closed = keep_closed
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.fingerprinter = fingerprinter
+        self.metrics = metrics
+        self.services_file = services_file
+        self.on_open = on_open
+        self.on_progress = on_progress
+        self.priority = priority
+        self.governor = governor
+        self.coordinator = coordinator
+        self.results: Dict[str, HostResults] = {}
+
+    def _new_state(self, hosts: Iterable[str]) -> _ScanState:
+        if self.workers > 1 or self.coordinator is not None:
+            # Shards are planned from the resume state, and rate control and
+            # retries run inside the workers
+            return _ScanState(iter(()), self.ports, None, None, self.keep_closed, self.sink,
+                              self.checkpoint, self.resume, self.fingerprinter, self.metrics,
+                              self.on_open, self.on_progress)
+        return _ScanState(interleave_probes(hosts, self.ports, self.host_window, self.priority), self.ports,
+                          self.rate, self.retries, self.keep_closed, self.sink, self.checkpoint,
+                          self.resume, self.fingerprinter, self.metrics,
+                          self.on_open, self.on_progress, self.governor)
+
+    def _adaptive_bounds(self) -> Optional[Tuple[float, float]]:
+        if self.timeout_policy is None:
+            return None
+        return (self.timeout_policy.floor, self.timeout_policy.ceiling)
+
+    def _run_sharded(self, state: _ScanState, hosts: Iterable[str]) -> Iterator[Tuple[str, ScanResult]]:
+        # Deferred: sharding pulls in multiprocessing, which single-process scans never use
+        from sharding import run_sharded
+
+        return run_sharded(
+            state, hosts, self.ports, self.workers, self.timeout, self.concurrency, self.engine,
+            self.host_window, self._adaptive_bounds(),
+            self.rate.max_rate if self.rate is not None else None,
+            self.retries.max_retries if self.retries is not None else 0,
+            self.services_file, self.resume,
+            self.governor.reserve if self.governor is not None else None
+        )
+
+    def _run_coordinated(self, state: _ScanState, hosts: Iterable[str]) -> Iterator[Tuple[str, ScanResult]]:
+        from distributed import run_coordinated
+
+        # Keyword arguments of sharding._scan_shard, sent to the workers with each lease
+        settings = {
+            'timeout': self.timeout,
+            'concurrency': self.concurrency,
+            'engine': self.engine,
+            'adaptive_bounds': self._adaptive_bounds(),
+            'max_rate': self.rate.max_rate if self.rate is not None else None,
+            'max_retries': self.retries.max_retries if self.retries is not None else 0,
+        }
+        return run_coordinated(state, hosts, self.ports, self.coordinator, settings,
+                               self.host_window, self.resume)
+
+    def scan(self, hosts: Iterable[str]) -> Iterator[Tuple[str, ScanResult]]:
+        """
+        Scan hosts, yielding (host, result) as each probe completes.
+
+        hosts may be a generator; it is consumed lazily. A
+        scheduler.HostFeed (e.g. from discovery.discover_hosts) is taken
+        from as hosts arrive, without waiting while probes are in flight.
+        With the async engine the event loop runs on a separate thread.
+        Breaking out of the loop cancels the probes still in flight.
+        """
+        state = self._new_state(hosts)
+        try:
+            if self.coordinator is not None:
+                yield from self._run_coordinated(state, hosts)
+            elif self.workers > 1:
+                yield from self._run_sharded(state, hosts)
+            elif self.engine == 'async':
+                yield from self._pump_async(state)
+            elif self.engine == 'syn':
+                yield from run_syn(state, self.concurrency, self.timeout,
+                                   self.timeout_policy, self.rate, self.metrics)
+            else:
+                yield from run_threaded(state, self.concurrency, self.timeout,
+                                        self.timeout_policy, self.rate, self.metrics, self.governor)
+        finally:
+            self.results = state.finish()
+
+    def _pump_async(self, state: _ScanState) -> Iterator[Tuple[str, ScanResult]]:
+        """Run the async engine on its own event loop thread and relay its results."""
+        import asyncio
+        queue = SimpleQueue()
+        loop = asyncio.new_event_loop()
+
+        async def produce() -> None:
+            async for item in run_async(state, self.concurrency, self.timeout,
+                                        self.timeout_policy, self.rate, self.metrics,
+                                        self.governor):
+                queue.put(item)
+
+        task = loop.create_task(produce())
+
+        def pump() -> None:
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+            except BaseException as exc:
+                queue.put(exc)
+            finally:
+                try:
+                    # Let cancelled probes unwind before the loop goes away, as asyncio.run does
+                    remaining = asyncio.all_tasks(loop)
+                    for leftover in remaining:
+                        leftover.cancel()
+                    if remaining:
+                        loop.run_until_complete(asyncio.gather(*remaining, return_exceptions=True))
+                    loop.run_until_complete(loop.shutdown_asyncgens())
+                finally:
+                    asyncio.set_event_loop(None)
+                    loop.close()
+                    queue.put(_END)
+
+        thread = threading.Thread(target=pump, name="scanner-event-loop", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = queue.get()
+                if item is _END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            if not task.done():
+                try:
+                    loop.call_soon_threadsafe(task.cancel)
+                except RuntimeError:  # The loop closed in the meantime
+                    pass
+            thread.join()
+
+    async def scan_async(self, hosts: Iterable[str]) -> AsyncIterator[Tuple[str, ScanResult]]:
+        """
+        Scan hosts on the running event loop, yielding (host, result) as each probe completes.
+
+        Raises:
+            ValueError: Unless the scanner uses the async engine in a single process
+        """
+        if self.engine != 'async' or self.workers > 1 or self.coordinator is not None:
+            raise ValueError("scan_async needs engine='async' and workers=1; use scan() otherwise")
+        import asyncio
+        state = self._new_state(hosts)
+        try:
+            async for item in run_async(state, self.concurrency, self.timeout,
+                                        self.timeout_policy, self.rate, self.metrics,
+                                        self.governor):
+                yield item
+        finally:
+            # finish() waits for fingerprinting and saves the checkpoint; keep that off the caller's loop
+            self.results = await asyncio.get_running_loop().run_in_executor(None, state.finish)
+
+    def run(self, hosts: Iterable[str]) -> Dict[str, HostResults]:
+        """Scan hosts to completion and return the results per host, in address order."""
+        for _ in self.scan(hosts):
+            pass
+        return self.results
@@ -0,0 +1,613 @@
+import ipaddress
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from adaptive_timeout import AdaptiveTimeout
+from checkpoint import Checkpoint, ResumeState
+from colors import Fore, Style
+from fingerprint import Fingerprinter
+from metrics import ScanMetrics
+from output_sinks import ResultSink
+from rate_control import RateController
+from resource_governor import LOCAL_RESOURCE_ERRNOS, ResourceGovernor
+from results import HostResults, PortIndex, ScanResult
+from tcp_scanner import (
+    ConsoleReporter,
+    scan_port_adaptive,
+    scan_port_adaptive_async,
+)
+
+
+# Seconds an engine waits for a HostFeed before looking at its probes in flight again
+HOST_POLL_INTERVAL = 0.05
+
+
+class HostFeed:
+    """
+    Hosts handed to a scan from another thread as they become known.
+
+    A producer (e.g. discovery.discover_hosts) put()s hosts and calls
+    end() when there are no more. Iterating a feed blocks for each host
+    like any generator, but the engines take windows of the hosts that
+    are already there (take) and wait between polls, so a slow producer
+    never holds up probes in flight or an event loop.
+
+    Args:
+        backlog (int): Hosts queued before put() waits for the scan
+    """
+
+    def __init__(self, backlog: int = 1024):
+        self.backlog = backlog
+        self._hosts = deque()
+        self._ready = threading.Condition()
+        self._ended = False
+        self._closed = False
+        self._error: Optional[BaseException] = None
+
+    def put(self, host: str) -> bool:
+        """Queue a host, waiting while the backlog is full; False if the scan has closed the feed."""
+        with self._ready:
+            while len(self._hosts) >= self.backlog and not self._closed:
+                self._ready.wait()
+            if self._closed:
+                return False
+            self._hosts.append(host)
+            self._ready.notify_all()
+            return True
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        """Mark the feed complete; error is raised to the scan once the queued hosts are taken."""
+        with self._ready:
+            self._ended = True
+            self._error = error
+            self._ready.notify_all()
+
+    def close(self) -> None:
+        """Stop accepting hosts (the scan is over); the producer should stop."""
+        with self._ready:
+            self._closed = True
+            self._hosts.clear()
+            self._ready.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def exhausted(self) -> bool:
+        """True once the feed has ended and every host has been taken."""
+        with self._ready:
+            return self._ended and not self._hosts
+
+    def take(self, limit: int) -> List[str]:
+        """
+        Return up to limit hosts without waiting; an empty list if none are queued.
+
+        Raises:
+            BaseException: The producer's error, once the hosts before it are taken
+        """
+        with self._ready:
+            count = min(limit, len(self._hosts))
+            window = [self._hosts.popleft() for _ in range(count)]
+            if window:
+                self._ready.notify_all()
+            elif self._ended and self._error is not None:
+                raise self._error
+            return window
+
+    def wait(self, timeout: float) -> None:
+        """Block until a host is queued or the feed ends, at most timeout seconds."""
+        with self._ready:
+            if not self._hosts and not self._ended:
+                self._ready.wait(timeout)
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            window = self.take(1)
+            if window:
+                yield window[0]
+            elif self.exhausted:
+                return
+            else:
+                self.wait(HOST_POLL_INTERVAL)
+
+
+def _next_window(hosts_iter: Iterator[str], feed: Optional[HostFeed],
+                host_window: int) -> Optional[List[str]]:
+    """
+    Take the next window of hosts; an empty list once they run out.
+
+    With a feed only the hosts already queued are taken, and None means
+    none are there yet.
+    """
+    if feed is None:
+        return list(islice(hosts_iter, host_window))
+    window = feed.take(host_window)
+    if not window and not feed.exhausted:
+        return None
+    return window
+
+
+def interleave_probes(hosts: Iterable[str], ports: List[int],
+                      host_window: int = 256,
+                      priority: Optional[Callable[[List[str]], Iterable[Tuple[str, int]]]] = None
+                      ) -> Iterator[Tuple[str, int]]:
+    """
+    Produce (host, port) probes interleaved across hosts.
+
+    Hosts are pulled lazily from the iterable in windows of host_window.
+    Within a window the order is port-major (port 1 on every host, then
+    port 2 on every host, ...), so consecutive probes hit different hosts
+    and no single host receives a burst of connects.
+
+    A HostFeed is never waited on: a window holds the hosts queued so far,
+    and while none are, the feed itself is yielded in place of a probe so
+    the engine can wait for it (see _ScanState.next_probe).
+
+    Args:
+        hosts (Iterable[str]): Target IP addresses, possibly a generator
+        ports (List[int]): Ports to probe on every host
+        host_window (int): Number of hosts interleaved at a time
+        priority (Callable): Optional; called with each window of hosts, it
+            returns (host, port) probes to send before the rest of the
+            window, e.g. ports that were open in earlier scans. Probes for
+            ports not in ports are dropped.
+
+    Yields:
+        Tuple[str, int]: (host, port) pairs
+    """
+    feed = hosts if isinstance(hosts, HostFeed) else None
+    hosts_iter = iter(hosts)
+    port_set = set(ports) if priority is not None else None
+    while True:
+        window = _next_window(hosts_iter, feed, host_window)
+        if window is None:
+            yield feed
+            continue
+        if not window:
+            return
+        first = set()
+        if priority is not None:
+            for probe in priority(window):
+                if probe[1] in port_set and probe not in first:
+                    first.add(probe)
+                    yield probe
+        for port in ports:
+            for host in window:
+                if not first or (host, port) not in first:
+                    yield (host, port)
+
+
+def _host_sort_key(host: str):
+    try:
+        address = ipaddress.ip_address(host)
+        return (0, address.version, address)
+    except ValueError:
+        return (1, host)
+
+
+class RetryQueue:
+    """
+    Bounded FIFO of probes to send again after a 'filtered' result.
+
+    A single timeout is often packet loss rather than a firewall, so a
+    filtered port gets up to max_retries further probes. Only 'filtered'
+    results are retried, and once the queue holds max_size probes further
+    filtered results are accepted as final instead of growing memory.
+    """
+
+    def __init__(self, max_retries: int = 1, max_size: int = 10000):
+        self.max_retries = max_retries
+        self.max_size = max_size
+        self._queue = deque()
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def offer(self, host: str, port: int, attempt: int, status: str) -> bool:
+        """Queue a retry if the result qualifies; return True if it was queued."""
+        if status != 'filtered' or attempt >= self.max_retries or len(self._queue) >= self.max_size:
+            return False
+        self._queue.append((host, port, attempt + 1))
+        return True
+
+    def pop(self) -> Optional[Tuple[str, int, int]]:
+        """Return the oldest queued (host, port, attempt), or None."""
+        return self._queue.popleft() if self._queue else None
+
+
+class _ScanState:
+    """
+    Bookkeeping shared by the thread and async engines: probe order, retries and results.
+
+    Presentation is left to the on_open(host, result) and
+    on_progress(done, open_count) callbacks. With a governor, probes that
+    failed for lack of local resources are sent again ahead of everything
+    else instead of being recorded.
+    """
+
+    def __init__(self, probes: Iterator[Tuple[str, int]], ports: List[int],
+                 rate: Optional[RateController],
+                 retries: Optional[RetryQueue], keep_closed: bool,
+                 sink: Optional[ResultSink], checkpoint: Optional[Checkpoint],
+                 resume: Optional[ResumeState],
+                 fingerprinter: Optional[Fingerprinter] = None,
+                 metrics: Optional[ScanMetrics] = None,
+                 on_open: Optional[Callable[[str, ScanResult], None]] = None,
+                 on_progress: Optional[Callable[[int, int], None]] = None,
+                 governor: Optional[ResourceGovernor] = None):
+        self.rate = rate
+        self.retries = retries
+        self.port_index = PortIndex(ports)
+        self.keep_closed = keep_closed
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.fingerprinter = fingerprinter
+        self.metrics = metrics
+        self.on_open = on_open
+        self.on_progress = on_progress
+        self.governor = governor
+        self.requeued = deque()
+        self.results_by_host: Dict[str, HostResults] = {}
+
+        if resume is not None:
+            self.results_by_host = resume.restore(self.port_index, keep_closed)
+            probes = (probe for probe in probes
+                      if isinstance(probe, HostFeed) or not resume.is_done(*probe))
+        self.probes = probes
+        # The HostFeed that ran dry while more hosts may still come, if any
+        self.waiting_for: Optional[HostFeed] = None
+
+        if checkpoint is not None:
+            checkpoint.attach(self.results_by_host)
+        if metrics is not None:
+            if retries is not None:
+                metrics.add_gauge('retry_queue_depth', "Filtered probes waiting to be retried",
+                                  lambda: len(retries))
+            if rate is not None:
+                metrics.add_gauge('probe_rate_limit', "Current probes per second allowed by AIMD",
+                                  lambda: round(rate.rate, 1))
+            if governor is not None:
+                metrics.add_gauge('probes_requeued', "Probes sent again after a local resource error",
+                                  lambda: governor.requeued)
+        self.done = 0
+        self.open_count = 0
+
+    def next_probe(self) -> Optional[Tuple[str, int, int]]:
+        """
+        Return the next (host, port, attempt), preferring re-queued probes, then retries.
+
+        None means there is nothing to send now; the scan is only over if
+        waiting_for is None as well, otherwise the engine calls
+        wait_for_hosts() (or polls its probes in flight) and asks again.
+        """
+        if self.requeued:
+            return self.requeued.popleft()
+        if self.retries is not None:
+            retry = self.retries.pop()
+            if retry is not None:
+                return retry
+        for probe in self.probes:
+            if isinstance(probe, HostFeed):
+                self.waiting_for = probe
+                return None
+            self.waiting_for = None
+            return (probe[0], probe[1], 0)
+        self.waiting_for = None
+        return None
+
+    def wait_for_hosts(self, timeout: float) -> None:
+        """Block until waiting_for has hosts again or ends, at most timeout seconds."""
+        if self.waiting_for is not None:
+            self.waiting_for.wait(timeout)
+
+    def complete(self, host: str, port: int, attempt: int,
+                 result) -> Optional[ScanResult]:
+        """
+        Handle a finished probe: feed the rate controller, retry or record it.
+
+        Returns:
+            ScanResult: The recorded result, or None if the probe was queued
+                to be sent again instead
+        """
+        if self.metrics is not None:
+            self.metrics.probe_finished(result['status'], result['response_time'])
+        if self.rate is not None:
+            self.rate.record(result['status'])
+        if self.governor is not None and self.governor.requeue(host, port, result):
+            # Same attempt: the probe never reached the target
+            self.requeued.append((host, port, attempt))
+            return None
+        if self.retries is not None and self.retries.offer(host, port, attempt, result['status']):
+            return None
+
+        host_results = self.results_by_host.get(host)
+        if host_results is None:
+            host_results = self.results_by_host[host] = HostResults(self.port_index, self.keep_closed)
+        # One record is shared by the results, the caller and the fingerprinter
+        if not isinstance(result, ScanResult):
+            result = ScanResult.from_dict(result)
+        if not host_results.add(result):
+            return result  # A repeated address; its first result stands and was reported
+        if self.fingerprinter is not None and result.status == 'open':
+            # The fingerprinter writes the record to the sink once the service is known
+            self.fingerprinter.submit(host, result, self.sink)
+        elif self.sink is not None:
+            self.sink.write(host, result)
+        if self.checkpoint is not None:
+            self.checkpoint.maybe_save()
+
+        self.done += 1
+        if result.status == 'open':
+            self.open_count += 1
+            if self.on_open is not None:
+                self.on_open(host, result)
+        if self.on_progress is not None:
+            self.on_progress(self.done, self.open_count)
+        return result
+
+    def finish(self) -> Dict[str, HostResults]:
+        if self.fingerprinter is not None:
+            self.fingerprinter.wait()
+        if self.checkpoint is not None:
+            self.checkpoint.save()
+        return _finish(self.results_by_host)
+
+
+def _paced_probe(host: str, port: int, timeout: float,
+                 timeout_policy: Optional[AdaptiveTimeout],
+                 rate: Optional[RateController],
+                 metrics: Optional[ScanMetrics] = None,
+                 governor: Optional[ResourceGovernor] = None) -> Dict[str, any]:
+    """Thread-pool probe: wait for a send slot, then scan."""
+    if rate is not None:
+        rate.acquire()
+    if metrics is not None:
+        metrics.probe_started()
+    result = scan_port_adaptive(host, port, timeout, timeout_policy)
+    if governor is not None and result.get('errno') in LOCAL_RESOURCE_ERRNOS:
+        # Backing off in the worker leaves fewer sockets open until resources free up
+        time.sleep(governor.pause())
+    return result
+
+
+async def _probe_async(host: str, port: int, timeout: float,
+                       timeout_policy: Optional[AdaptiveTimeout],
+                       governor: Optional[ResourceGovernor] = None) -> Dict[str, any]:
+    """Event-loop probe; backs off after a local resource error like _paced_probe."""
+    result = await scan_port_adaptive_async(host, port, timeout, timeout_policy)
+    if governor is not None and result.get('errno') in LOCAL_RESOURCE_ERRNOS:
+        import asyncio
+        # Still holding its semaphore slot, so fewer connects are in flight meanwhile
+        await asyncio.sleep(governor.pause())
+    return result
+
+
+def _finish(results_by_host: Dict[str, HostResults]) -> Dict[str, HostResults]:
+    """Order hosts by address (each HostResults iterates in port order)."""
+    return {host: results_by_host[host] for host in sorted(results_by_host, key=_host_sort_key)}
+
+
+def run_threaded(state: _ScanState, max_threads: int, timeout: float,
+                 timeout_policy: Optional[AdaptiveTimeout] = None,
+                 rate: Optional[RateController] = None,
+                 metrics: Optional[ScanMetrics] = None,
+                 governor: Optional[ResourceGovernor] = None) -> Iterator[Tuple[str, ScanResult]]:
+    """
+    Thread-pool engine: yield (host, result) as each probe is recorded.
+
+    Probes are submitted in a bounded sliding window (twice the pool
+    size). Closing the generator early cancels the probes not yet started.
+    With a governor, workers pause after a local resource error (see
+    ResourceGovernor); the pool size itself is capped by the caller.
+    """
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        in_flight = {}
+
+        def fill() -> None:
+            while len(in_flight) < max_threads * 2:
+                probe = state.next_probe()
+                if probe is None:
+                    return
+                host, port, _ = probe
+                if metrics is not None:
+                    metrics.probe_queued()
+                future = executor.submit(_paced_probe, host, port, timeout, timeout_policy, rate, metrics,
+                                         governor)
+                in_flight[future] = probe
+
+        try:
+            fill()
+            while in_flight or state.waiting_for is not None:
+                if not in_flight:
+                    state.wait_for_hosts(HOST_POLL_INTERVAL)
+                    fill()
+                    continue
+                # While hosts are awaited, new ones are picked up between completions
+                poll = HOST_POLL_INTERVAL if state.waiting_for is not None else None
+                done, _ = wait(in_flight, timeout=poll, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host, port, attempt = in_flight.pop(future)
+                    result = state.complete(host, port, attempt, future.result())
+                    if result is not None:
+                        yield (host, result)
+                fill()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+async def run_async(state: _ScanState, max_concurrency: int, timeout: float,
+                    timeout_policy: Optional[AdaptiveTimeout] = None,
+                    rate: Optional[RateController] = None,
+                    metrics: Optional[ScanMetrics] = None,
+                    governor: Optional[ResourceGovernor] = None) -> AsyncIterator[Tuple[str, ScanResult]]:
+    """
+    Event-loop engine: yield (host, result) as each probe is recorded.
+
+    A semaphore bounds the connects in flight. Closing the generator early
+    cancels them.
+    """
+    import asyncio
+    semaphore = asyncio.Semaphore(max_concurrency)
+    pending = set()
+    completed = deque()
+
+    def on_done(task: asyncio.Task, probe: Tuple[str, int, int]) -> None:
+        pending.discard(task)
+        semaphore.release()
+        if task.cancelled():
+            return
+        result = state.complete(*probe, task.result())
+        if result is not None:
+            completed.append((probe[0], result))
+
+    try:
+        while True:
+            while completed:
+                yield completed.popleft()
+
+            probe = state.next_probe()
+            if probe is None and state.waiting_for is not None:
+                if pending:
+                    await asyncio.wait(set(pending), timeout=HOST_POLL_INTERVAL,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    # Off the loop, so other tasks sharing it (scan_async) keep running
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, state.wait_for_hosts, HOST_POLL_INTERVAL)
+                continue
+            if probe is None:
+                if not pending:
+                    break
+                # Retries may still be queued by probes in flight
+                await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            if metrics is not None:
+                metrics.probe_queued()
+            if rate is not None:
+                await rate.acquire_async()
+            await semaphore.acquire()
+            if metrics is not None:
+                metrics.probe_started()
+            host, port, _ = probe
+            task = asyncio.create_task(_probe_async(host, port, timeout, timeout_policy, governor))
+            pending.add(task)
+            task.add_done_callback(lambda t, p=probe: on_done(t, p))
+
+        while completed:
+            yield completed.popleft()
+    finally:
+        for task in list(pending):
+            task.cancel()
+
+
+def scan_targets(hosts: Iterable[str], ports: List[int], timeout: float = 2.0,
+                 max_threads: int = 100, show_progress: bool = True,
+                 host_window: int = 256, quiet: bool = False,
+                 timeout_policy: Optional[AdaptiveTimeout] = None,
+                 rate: Optional[RateController] = None,
+                 retries: Optional[RetryQueue] = None,
+                 keep_closed: bool = True,
+                 sink: Optional[ResultSink] = None,
+                 checkpoint: Optional[Checkpoint] = None,
+                 resume: Optional[ResumeState] = None,
+                 fingerprinter: Optional[Fingerprinter] = None,
+                 metrics: Optional[ScanMetrics] = None,
+                 governor: Optional[ResourceGovernor] = None) -> Dict[str, HostResults]:
+    """
+    Scan many hosts with one shared thread pool.
+
+    Probes come from interleave_probes and are submitted in a bounded
+    sliding window (twice the pool size), so the host generator is never
+    materialized and an unresponsive host only ever occupies its share of
+    the workers. Queued retries are sent before new probes.
+
+    See scanner.Scanner for the same engine as a streaming iterator.
+
+    Args:
+        hosts (Iterable[str]): Target IP addresses, possibly a generator
+        ports (List[int]): Ports to scan on every host
+        timeout (float): Connection timeout per port
+        max_threads (int): Maximum concurrent threads
+        show_progress (bool): Whether to show progress bar
+        host_window (int): Number of hosts interleaved at a time
+        quiet (bool): Suppress all console output (used by worker processes)
+        timeout_policy (AdaptiveTimeout): Optional per-host RTT-based timeouts
+        rate (RateController): Optional probes-per-second limit with AIMD backoff
+        retries (RetryQueue): Optional re-probing of 'filtered' results
+        keep_closed (bool): Keep full records for closed ports; when False
+            they are only counted (streaming mode)
+        sink (ResultSink): Optional output written as each result arrives
+        checkpoint (Checkpoint): Optional periodic save of completed probes
+        resume (ResumeState): Completed probes to skip and restore
+        fingerprinter (Fingerprinter): Optional service fingerprinting of
+            open ports, run alongside the sweep
+        metrics (ScanMetrics): Optional live counters and latency histogram
+        governor (ResourceGovernor): Optional file descriptor budget; caps
+            max_threads and re-queues probes that hit local resource errors
+
+    Returns:
+        Dict[str, HostResults]: Results per host IP, in address order
+    """
+    if governor is not None:
+        max_threads = governor.cap(max_threads)
+    if not quiet:
+        print(f"{Fore.CYAN}Scanning {len(ports)} ports per host with {max_threads} threads...{Style.RESET_ALL}")
+    console = None if quiet else ConsoleReporter(show_progress)
+    state = _ScanState(interleave_probes(hosts, ports, host_window), ports, rate, retries,
+                       keep_closed, sink, checkpoint, resume, fingerprinter, metrics,
+                       console and console.on_open, console and console.on_progress, governor)
+    try:
+        for _ in run_threaded(state, max_threads, timeout, timeout_policy, rate, metrics, governor):
+            pass
+    finally:
+        if console is not None:
+            console.close()
+    return state.finish()
+
+
+async def scan_targets_async(hosts: Iterable[str], ports: List[int], timeout: float = 2.0,
+                             max_concurrency: int = 500, show_progress: bool = True,
+                             host_window: int = 256, quiet: bool = False,
+                             timeout_policy: Optional[AdaptiveTimeout] = None,
+                             rate: Optional[RateController] = None,
+                             retries: Optional[RetryQueue] = None,
+                             keep_closed: bool = True,
+                             sink: Optional[ResultSink] = None,
+                             checkpoint: Optional[Checkpoint] = None,
+                             resume: Optional[ResumeState] = None,
+                             fingerprinter: Optional[Fingerprinter] = None,
+                             metrics: Optional[ScanMetrics] = None,
+                             governor: Optional[ResourceGovernor] = None) -> Dict[str, HostResults]:
+    """
+    Scan many hosts on a single event loop.
+
+    Same scheduling as scan_targets, with a semaphore bounding the number
+    of connects in flight instead of a thread pool.
+
+    Returns:
+        Dict[str, HostResults]: Results per host IP, in address order
+    """
+    if governor is not None:
+        max_concurrency = governor.cap(max_concurrency)
+    if not quiet:
+        print(f"{Fore.CYAN}Scanning {len(ports)} ports per host with up to "
+              f"{max_concurrency} concurrent connects...{Style.RESET_ALL}")
+    console = None if quiet else ConsoleReporter(show_progress)
+    state = _ScanState(interleave_probes(hosts, ports, host_window), ports, rate, retries,
+                       keep_closed, sink, checkpoint, resume, fingerprinter, metrics,
+                       console and console.on_open, console and console.on_progress, governor)
+    try:
+        async for _ in run_async(state, max_concurrency, timeout, timeout_policy, rate, metrics,
+                                 governor):
+            pass
+    finally:
+        if console is not None:
+            console.close()
+    return state.finish()
@@ -1,19 +1,100 @@
-
+import os
 import socket
+from functools import lru_cache
+from typing import List, Optional
+
 from port_parser import validate_port
 
+# Service names file shipped with PortSpy, for results that do not depend on
+# the scanning host's NSS configuration
+BUNDLED_SERVICES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "services")
 
-def identify_service(port: int) -> str:
-   
+# Locations of the system services database, parsed directly instead of
+# asking NSS once per port
+_SYSTEM_SERVICES_FILES = (
+    "/etc/services",
+    os.path.join(os.environ.get("SystemRoot", r"C:\Windows"), "System32", "drivers", "etc", "services"),
+)
+
+# port -> upper-case service name, indexed by port number (65,536 entries)
+_service_table: Optional[List[Optional[str]]] = None
+
+
+def parse_services_file(path: str, protocol: str = "tcp") -> List[Optional[str]]:
+    """
+    Build a port-indexed service table from a services(5) style file.
+
+    Lines look like "ssh  22/tcp  [aliases]  [# comment]". The first name
+    listed for a port wins, matching getservbyport.
+
+    Returns:
+        List[Optional[str]]: 65,536 entries, None where no service is known
+    """
+    table: List[Optional[str]] = [None] * 65536
+    with open(path, "r", encoding="utf-8", errors="replace") as handle:
+        for line in handle:
+            fields = line.split("#", 1)[0].split()
+            if len(fields) < 2 or "/" not in fields[1]:
+                continue
+            port_str, proto = fields[1].split("/", 1)
+            if proto.lower() != protocol:
+                continue
+            try:
+                port = int(port_str)
+            except ValueError:
+                continue
+            if validate_port(port) and table[port] is None:
+                table[port] = fields[0].upper()
+    return table
+
+
+def load_services(path: Optional[str] = None) -> None:
+    """
+    Load the service table used by identify_service.
+
+    Args:
+        path (str): A services file, BUNDLED_SERVICES_FILE, or None to use
+            the system database. Without a readable system file, lookups
+            fall back to a cached getservbyport per port.
+    """
+    global _service_table
+    if path is not None:
+        _service_table = parse_services_file(path)
+        return
+
+    for candidate in _SYSTEM_SERVICES_FILES:
+        if os.path.isfile(candidate):
+            try:
+                _service_table = parse_services_file(candidate)
+                return
+            except OSError:
+                continue
+
+    # No file we can parse: keep using NSS, one lookup per distinct port
+    _service_table = []
+
+
+@lru_cache(maxsize=None)
+def _getservbyport(port: int) -> str:
     try:
-        # Validate port first
-        if not validate_port(port):
-            return "UNKNOWN"
-            
-        # Query system's service database
-        service_name = socket.getservbyport(port, "tcp")
-        return service_name.upper()  
-        
+        return socket.getservbyport(port, "tcp").upper()
     except OSError:
-        # Service not found in system database
-        return "UNKNOWN"
\ No newline at end of file
+        return "UNKNOWN"
+
+
+def identify_service(port: int) -> str:
+    """
+    Return the well-known service name for a TCP port, or "UNKNOWN".
+
+    The lookup is an index into a table built once on first use, so it
+    costs nothing on the scan hot path.
+    """
+    if not validate_port(port):
+        return "UNKNOWN"
+
+    if _service_table is None:
+        load_services()
+
+    if not _service_table:
+        return _getservbyport(port)
+    return _service_table[port] or "UNKNOWN"
@@ -0,0 +1,236 @@
+import struct
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from adaptive_timeout import AdaptiveTimeout
+from checkpoint import Checkpoint, ResumeState
+from colors import Fore, Style
+from fingerprint import Fingerprinter
+from metrics import ScanMetrics
+from output_sinks import ResultSink
+from rate_control import RateController
+from resource_governor import ResourceGovernor
+from results import HostResults, ScanResult
+from scheduler import (
+    HOST_POLL_INTERVAL,
+    HostFeed,
+    RetryQueue,
+    scan_targets,
+    scan_targets_async,
+    _next_window,
+    _ScanState,
+)
+from service_map import identify_service, load_services
+from tcp_scanner import STATUS_CODES, STATUS_INDEX, ConsoleReporter
+
+# One packed record per probe: port, status code, response time in milliseconds
+_RECORD = struct.Struct("!HBI")
+
+
+def pack_results(results: Iterable[Dict[str, any]]) -> bytes:
+    """Pack result dicts into compact fixed-size records (7 bytes per port)."""
+    return b"".join(
+        _RECORD.pack(r['port'], STATUS_INDEX.get(r['status'], 0),
+                     int(round(r['response_time'] * 1000)))
+        for r in results
+    )
+
+
+def unpack_results(data: bytes) -> Iterator[ScanResult]:
+    """Rebuild results from records produced by pack_results."""
+    for port, code, millis in _RECORD.iter_unpack(data):
+        yield ScanResult(port, STATUS_CODES[code], identify_service(port), millis / 1000)
+
+
+def _scan_shard(hosts: List[str], ports: List[int], timeout: float,
+                concurrency: int, engine: str,
+                adaptive_bounds: Optional[Tuple[float, float]],
+                max_rate: Optional[float], max_retries: int,
+                resource_reserve: Optional[int] = None) -> Dict[str, bytes]:
+    """Worker process entry point: scan one shard and return packed results."""
+    import asyncio
+    timeout_policy = None
+    if adaptive_bounds is not None:
+        timeout_policy = AdaptiveTimeout(timeout, *adaptive_bounds)
+    rate = RateController(max_rate) if max_rate else None
+    retries = RetryQueue(max_retries) if max_retries > 0 else None
+    # Each process has its own descriptor table, so each gets its own budget
+    governor = ResourceGovernor(resource_reserve) if resource_reserve is not None else None
+    
+    if engine == 'async':
+        results_by_host = asyncio.run(scan_targets_async(
+            hosts, ports, timeout=timeout, max_concurrency=concurrency, quiet=True,
+            timeout_policy=timeout_policy, rate=rate, retries=retries, governor=governor
+        ))
+    else:
+        results_by_host = scan_targets(
+            hosts, ports, timeout=timeout, max_threads=concurrency, quiet=True,
+            timeout_policy=timeout_policy, rate=rate, retries=retries, governor=governor
+        )
+    return {host: pack_results(results) for host, results in results_by_host.items()}
+
+
+def _stripes(ports: List[int], stripes: int) -> Iterator[List[int]]:
+    stripes = max(1, min(stripes, len(ports)))
+    for offset in range(stripes):
+        yield ports[offset::stripes]
+
+
+def make_shards(hosts: Iterable[str], ports: List[int], stripes: int,
+                host_window: int = 64,
+                resume: Optional[ResumeState] = None) -> Iterator[Tuple[List[str], List[int]]]:
+    """
+    Split the (host, port) space into shards.
+
+    Hosts are consumed lazily in windows; each window is paired with
+    interleaved port stripes (ports[0::n], ports[1::n], ...), so every
+    shard spreads its probes over the whole port range. When resuming,
+    hosts the checkpoint already knows get their own shards covering only
+    their unfinished ports. From a HostFeed, a window holds the hosts
+    queued so far, and while none are the feed is yielded instead of a
+    shard (as interleave_probes does).
+    """
+    feed = hosts if isinstance(hosts, HostFeed) else None
+    hosts_iter = iter(hosts)
+    while True:
+        window = _next_window(hosts_iter, feed, host_window)
+        if window is None:
+            yield feed
+            continue
+        if not window:
+            return
+
+        fresh = window
+        if resume is not None:
+            fresh = []
+            for host in window:
+                remaining = resume.remaining(host)
+                if remaining is None:
+                    fresh.append(host)
+                elif remaining:
+                    for stripe in _stripes(remaining, stripes):
+                        yield ([host], stripe)
+
+        if fresh:
+            for stripe in _stripes(ports, stripes):
+                yield (fresh, stripe)
+
+
+def run_sharded(state: _ScanState, hosts: Iterable[str], ports: List[int], workers: int,
+                timeout: float = 2.0, concurrency: int = 50, engine: str = 'thread',
+                host_window: int = 64,
+                adaptive_bounds: Optional[Tuple[float, float]] = None,
+                max_rate: Optional[float] = None, max_retries: int = 0,
+                services_file: Optional[str] = None,
+                resume: Optional[ResumeState] = None,
+                resource_reserve: Optional[int] = None) -> Iterator[Tuple[str, ScanResult]]:
+    """
+    Worker-process engine: yield (host, result) as each shard's results are merged.
+
+    state does the bookkeeping (it is built without rate control or
+    retries, which run inside the workers). With resource_reserve, every
+    worker runs a ResourceGovernor keeping that many descriptors free.
+    Closing the generator early cancels the shards not yet started.
+    """
+    shards = make_shards(hosts, ports, stripes=workers * 4, host_window=host_window, resume=resume)
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_services,
+                             initargs=(services_file,)) as executor:
+        in_flight = set()
+
+        # Returns the HostFeed if it ran dry before the limit was reached
+        def fill() -> Optional[HostFeed]:
+            while len(in_flight) < workers * 2:
+                shard = next(shards, None)
+                if shard is None:
+                    return None
+                if isinstance(shard, HostFeed):
+                    return shard
+                shard_hosts, shard_ports = shard
+                in_flight.add(executor.submit(
+                    _scan_shard, shard_hosts, shard_ports, timeout, concurrency, engine,
+                    adaptive_bounds, max_rate / workers if max_rate else None, max_retries,
+                    resource_reserve
+                ))
+            return None
+
+        try:
+            waiting_for = fill()
+            while in_flight or waiting_for is not None:
+                if not in_flight:
+                    waiting_for.wait(HOST_POLL_INTERVAL)
+                    waiting_for = fill()
+                    continue
+                poll = HOST_POLL_INTERVAL if waiting_for is not None else None
+                done, _ = wait(in_flight, timeout=poll, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.discard(future)
+                    for host, packed in future.result().items():
+                        for result in unpack_results(packed):
+                            yield (host, state.complete(host, result.port, 0, result))
+                waiting_for = fill()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+def scan_targets_sharded(hosts: Iterable[str], ports: List[int], workers: int,
+                         timeout: float = 2.0, concurrency: int = 50,
+                         engine: str = 'thread', show_progress: bool = True,
+                         host_window: int = 64,
+                         adaptive_bounds: Optional[Tuple[float, float]] = None,
+                         max_rate: Optional[float] = None,
+                         max_retries: int = 0,
+                         services_file: Optional[str] = None,
+                         keep_closed: bool = True,
+                         sink: Optional[ResultSink] = None,
+                         checkpoint: Optional[Checkpoint] = None,
+                         resume: Optional[ResumeState] = None,
+                         fingerprinter: Optional[Fingerprinter] = None,
+                         metrics: Optional[ScanMetrics] = None) -> Dict[str, HostResults]:
+    """
+    Scan targets with a pool of worker processes.
+
+    Each shard runs the regular scan engine in its own process. Shards are
+    submitted in a bounded window and their packed results are merged as
+    they arrive, so open ports are reported while the scan is running.
+
+    Args:
+        hosts (Iterable[str]): Target IP addresses, possibly a generator
+        ports (List[int]): Ports to scan on every host
+        workers (int): Number of worker processes
+        timeout (float): Connection timeout per port
+        concurrency (int): Threads (or async connects) per worker process
+        engine (str): "thread" or "async", the engine each worker runs
+        show_progress (bool): Whether to show progress bar
+        host_window (int): Number of hosts per shard
+        adaptive_bounds (Tuple[float, float]): (floor, ceiling) to enable
+            adaptive timeouts; each worker keeps its own RTT estimates
+        max_rate (float): Total probes per second, split evenly across workers
+        max_retries (int): Re-probes of filtered ports within each shard
+        services_file (str): Services file each worker loads its table from
+        keep_closed (bool): Keep full records for closed ports in the parent
+        sink (ResultSink): Optional output written as each shard's results arrive
+        checkpoint (Checkpoint): Optional periodic save of completed probes
+        resume (ResumeState): Completed probes to skip and restore
+        fingerprinter (Fingerprinter): Optional service fingerprinting of
+            open ports, run in this process as shard results arrive
+        metrics (ScanMetrics): Optional live counters, updated as shard
+            results arrive (probes in flight inside workers are not visible)
+
+    Returns:
+        Dict[str, HostResults]: Results per host IP, in address order
+    """
+    print(f"{Fore.CYAN}Scanning {len(ports)} ports per host with {workers} worker processes "
+          f"x {concurrency} {engine} connects...{Style.RESET_ALL}")
+    console = ConsoleReporter(show_progress)
+    # Shards are planned from the resume state, so no probes go through state itself
+    state = _ScanState(iter(()), ports, None, None, keep_closed, sink, checkpoint, resume,
+                       fingerprinter, metrics, console.on_open, console.on_progress)
+    try:
+        for _ in run_sharded(state, hosts, ports, workers, timeout, concurrency, engine,
+                             host_window, adaptive_bounds, max_rate, max_retries,
+                             services_file, resume):
+            pass
+    finally:
+        console.close()
+    return state.finish()
@@ -0,0 +1,278 @@
+import heapq
+import os
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from array import array
+from queue import Empty, SimpleQueue
+from typing import Dict, Iterator, Optional, Tuple
+
+from adaptive_timeout import AdaptiveTimeout
+from host_resolver import address_family
+from metrics import ScanMetrics
+from rate_control import RateController
+from results import ScanResult
+from scheduler import HOST_POLL_INTERVAL, _ScanState
+from service_map import identify_service
+
+# TCP flag bits
+_SYN, _RST, _ACK = 0x02, 0x04, 0x10
+
+# SYN with an MSS option, as real stacks send; data offset 6 (24 bytes)
+_TCP_HEADER = struct.Struct("!HHIIBBHHH")
+_MSS_OPTION = struct.pack("!BBH", 2, 4, 1460)
+_SYN_LENGTH = _TCP_HEADER.size + len(_MSS_OPTION)
+
+# Source address cache entries kept before it is cleared
+_MAX_SOURCES = 4096
+
+
+def syn_unavailable() -> Optional[str]:
+    """Return why SYN scanning cannot run here, or None if it can."""
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP).close()
+    except PermissionError:
+        return "SYN scanning needs root or the CAP_NET_RAW capability"
+    except (OSError, AttributeError) as exc:
+        return f"Raw sockets are not available: {exc}"
+    return None
+
+
+def _checksum(data: bytes) -> bytes:
+    """Internet checksum (RFC 1071) of data, as the two bytes to put in a header."""
+    if len(data) % 2:
+        data += b"\x00"
+    # The one's complement sum is byte-order independent, so words are summed
+    # in native order and the result is packed back the same way
+    total = sum(array("H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return struct.pack("=H", ~total & 0xFFFF)
+
+
+class SynProber:
+    """
+    Sends SYN packets from raw sockets and reads the replies on a receiver thread.
+
+    Every probe leaves from one source port with a sequence number that is
+    a keyed hash (cookie) of the target address and port. A reply is
+    genuine only if it acknowledges cookie + 1, so the receiver validates
+    replies without any table of outstanding probes and ignores stray
+    traffic. Matched replies are put on .replies as (address, port,
+    status, received_at), where address is packed as returned by send(),
+    with status 'open' for SYN-ACK and 'closed' for RST.
+
+    The kernel answers SYN-ACKs with a RST, since no socket owns the
+    source port, so no connection is ever established on the target.
+
+    Args:
+        source_port (int): Source port of every probe (random by default)
+        receive_buffer (int): Receive buffer size requested for each raw socket
+    """
+
+    def __init__(self, source_port: Optional[int] = None, receive_buffer: int = 4 * 1024 * 1024):
+        self.source_port = source_port or random.randint(40000, 60000)
+        self.receive_buffer = receive_buffer
+        self.replies: SimpleQueue = SimpleQueue()
+        self._secret = int.from_bytes(os.urandom(8), "big")
+        self._sockets: Dict[int, socket.socket] = {}
+        self._sources: Dict[str, bytes] = {}
+        self._stop = threading.Event()
+        self._socket_added = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._receive, name="syn-receiver", daemon=True)
+        self._thread.start()
+
+    def cookie(self, address: bytes, port: int) -> int:
+        """The sequence number of the probe to a packed address and port."""
+        return hash((self._secret, address, port)) & 0xFFFFFFFF
+
+    def _socket(self, family: int) -> socket.socket:
+        sock = self._sockets.get(family)
+        if sock is None:
+            with self._lock:
+                sock = self._sockets.get(family)
+                if sock is None:
+                    sock = socket.socket(family, socket.SOCK_RAW, socket.IPPROTO_TCP)
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+                    self._sockets[family] = sock
+                    self._socket_added.set()
+        return sock
+
+    def _source(self, ip: str, family: int) -> bytes:
+        """Local address the kernel routes packets to ip from, packed."""
+        source = self._sources.get(ip)
+        if source is None:
+            # Connecting a UDP socket picks the route without sending anything
+            with socket.socket(family, socket.SOCK_DGRAM) as probe:
+                probe.connect((ip, 9))
+                source = socket.inet_pton(family, probe.getsockname()[0])
+            if len(self._sources) >= _MAX_SOURCES:
+                self._sources.clear()
+            self._sources[ip] = source
+        return source
+
+    def send(self, ip: str, port: int) -> bytes:
+        """
+        Send one SYN to ip:port and return the packed destination address.
+
+        Raises:
+            OSError: If the packet cannot be sent (e.g. no route to the host)
+        """
+        family = address_family(ip)
+        source = self._source(ip, family)
+        destination = socket.inet_pton(family, ip)
+        header = _TCP_HEADER.pack(self.source_port, port, self.cookie(destination, port), 0,
+                                  (_SYN_LENGTH // 4) << 4, _SYN, 1024, 0, 0) + _MSS_OPTION
+        if family == socket.AF_INET:
+            pseudo = source + destination + struct.pack("!BBH", 0, socket.IPPROTO_TCP, _SYN_LENGTH)
+        else:
+            pseudo = source + destination + struct.pack("!I3xB", _SYN_LENGTH, socket.IPPROTO_TCP)
+        segment = header[:16] + _checksum(pseudo + header) + header[18:]
+        self._socket(family).sendto(segment, (ip, 0))
+        return destination
+
+    def _receive(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                sockets = list(self._sockets.values())
+            if not sockets:
+                self._socket_added.wait(0.1)
+                continue
+            try:
+                readable, _, _ = select.select(sockets, [], [], 0.1)
+            except (OSError, ValueError):  # A socket was closed by close()
+                continue
+            for sock in readable:
+                try:
+                    packet, address = sock.recvfrom(65535)
+                except OSError:
+                    continue
+                received_at = time.monotonic()
+                if sock.family == socket.AF_INET:
+                    # IPv4 raw sockets deliver the IP header as well
+                    self._match(packet[12:16], packet, (packet[0] & 0x0F) * 4, received_at)
+                else:
+                    source = socket.inet_pton(socket.AF_INET6, address[0].split("%", 1)[0])
+                    self._match(source, packet, 0, received_at)
+
+    def _match(self, address: bytes, packet: bytes, offset: int, received_at: float) -> None:
+        if len(packet) < offset + 20:
+            return
+        port, destination_port, _, ack = struct.unpack_from("!HHII", packet, offset)
+        if destination_port != self.source_port:
+            return
+        if (ack - 1) & 0xFFFFFFFF != self.cookie(address, port):
+            return
+        flags = packet[offset + 13]
+        if flags & (_SYN | _ACK) == _SYN | _ACK:
+            self.replies.put((address, port, 'open', received_at))
+        elif flags & _RST:
+            self.replies.put((address, port, 'closed', received_at))
+
+    def close(self) -> None:
+        self._stop.set()
+        self._socket_added.set()
+        self._thread.join()
+        for sock in self._sockets.values():
+            sock.close()
+
+
+def _result(port: int, status: str, response_time: float) -> Dict[str, any]:
+    return {
+        'port': port,
+        'status': status,
+        'service': identify_service(port),
+        'response_time': round(response_time, 3),
+    }
+
+
+def run_syn(state: _ScanState, max_in_flight: int, timeout: float,
+            timeout_policy: Optional[AdaptiveTimeout] = None,
+            rate: Optional[RateController] = None,
+            metrics: Optional[ScanMetrics] = None,
+            prober: Optional[SynProber] = None) -> Iterator[Tuple[str, ScanResult]]:
+    """
+    SYN scan engine: yield (host, result) as replies arrive or probes time out.
+
+    Probes come from state like in the other engines, with up to
+    max_in_flight awaiting a reply. A SYN-ACK means open, a RST closed,
+    and silence until the timeout filtered (ICMP errors are not read, so
+    unreachable hosts are reported as filtered as well). Needs root or
+    CAP_NET_RAW; see syn_unavailable.
+    """
+    prober = prober or SynProber()
+    # (packed address, port) -> (host, attempt, sent_at) for probes awaiting a reply
+    pending: Dict[Tuple[bytes, int], Tuple[str, int, float]] = {}
+    deadlines = []
+
+    def finish(host: str, port: int, attempt: int, result: Dict[str, any]):
+        if timeout_policy is not None:
+            timeout_policy.observe(host, result)
+        return state.complete(host, port, attempt, result)
+
+    try:
+        while True:
+            while len(pending) < max_in_flight:
+                probe = state.next_probe()
+                if probe is None:
+                    break
+                host, port, attempt = probe
+                if metrics is not None:
+                    metrics.probe_queued()
+                if rate is not None:
+                    rate.acquire()
+                if metrics is not None:
+                    metrics.probe_started()
+                sent_at = time.monotonic()
+                try:
+                    address = prober.send(host, port)
+                except OSError:
+                    recorded = finish(host, port, attempt, _result(port, 'unreachable', 0.0))
+                    if recorded is not None:
+                        yield (host, recorded)
+                    continue
+                wait_for = timeout_policy.timeout_for(host) if timeout_policy is not None else timeout
+                pending[(address, port)] = (host, attempt, sent_at)
+                heapq.heappush(deadlines, (sent_at + wait_for, sent_at, address, port))
+
+            if not pending:
+                if state.waiting_for is None:
+                    return
+                state.wait_for_hosts(HOST_POLL_INTERVAL)
+                continue
+
+            try:
+                reply = prober.replies.get(timeout=max(0.0, min(0.05, deadlines[0][0] - time.monotonic())))
+            except Empty:
+                reply = None
+            while reply is not None:
+                address, port, status, received_at = reply
+                entry = pending.pop((address, port), None)
+                if entry is not None:  # Otherwise a duplicate or a reply after the timeout
+                    host, attempt, sent_at = entry
+                    recorded = finish(host, port, attempt, _result(port, status, received_at - sent_at))
+                    if recorded is not None:
+                        yield (host, recorded)
+                try:
+                    reply = prober.replies.get_nowait()
+                except Empty:
+                    reply = None
+
+            now = time.monotonic()
+            while deadlines and deadlines[0][0] <= now:
+                deadline, sent_at, address, port = heapq.heappop(deadlines)
+                entry = pending.get((address, port))
+                # Skip probes already answered, or re-sent since this deadline was set
+                if entry is None or entry[2] != sent_at:
+                    continue
+                del pending[(address, port)]
+                host, attempt, _ = entry
+                recorded = finish(host, port, attempt, _result(port, 'filtered', deadline - sent_at))
+                if recorded is not None:
+                    yield (host, recorded)
+    finally:
+        prober.close()
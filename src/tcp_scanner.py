@@ -1,14 +1,37 @@
+# asyncio is imported inside the async functions: it is slow to import and the
+# thread engine never needs it
+import errno
 import socket
+import struct
+import sys
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from tqdm import tqdm
-from colorama import init, Fore, Back, Style
 
+from adaptive_timeout import AdaptiveTimeout
+from colors import Fore, Back, Style
+from host_resolver import address_family
+from resource_governor import LOCAL_RESOURCE_ERRNOS
 from service_map import identify_service
 
-# Initialize colorama for cross-platform colored output
-init(autoreset=True)
+# Errors meaning the address cannot be reached at all, e.g. an IPv6 target
+# from a host without an IPv6 route
+_UNREACHABLE_ERRNOS = (errno.EHOSTUNREACH, errno.ENETUNREACH)
+
+# SO_LINGER on with a zero timeout: close() resets the connection instead of
+# leaving it in TIME_WAIT, which would hold the local port for minutes
+_LINGER_RESET = struct.pack('hh' if sys.platform == 'win32' else 'ii', 1, 0)
+
+# Port states in a fixed order, so a state can travel as a single byte
+STATUS_CODES = ('unknown', 'open', 'closed', 'filtered', 'unreachable', 'error')
+STATUS_INDEX = {status: code for code, status in enumerate(STATUS_CODES)}
+
+
+def _probe_socket(ip: str) -> socket.socket:
+    """TCP socket for a single probe, closed with a reset rather than FIN."""
+    sock = socket.socket(address_family(ip), socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RESET)
+    return sock
 
 
 def tcp_scan_port(ip: str, port: int, timeout: float = 2.0) -> Dict[str, any]:
@@ -20,13 +43,13 @@ def tcp_scan_port(ip: str, port: int, timeout: float = 2.0) -> Dict[str, any]:
     result = {
         'port': port,
         'status': 'unknown',
-        'service': identify_service(port),
+        'service': 'UNKNOWN',
         'response_time': 0.0
     }
     
     try:
        
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock = _probe_socket(ip)
         
        
         sock.settimeout(timeout)
@@ -47,10 +70,13 @@ def tcp_scan_port(ip: str, port: int, timeout: float = 2.0) -> Dict[str, any]:
         
     except OSError as e:
         # Handle other network errors (host unreachable, etc.)
-        if e.errno == 113:  # No route to host
+        if e.errno in _UNREACHABLE_ERRNOS:  # No route to host or network
             result['status'] = 'unreachable'
         else:
             result['status'] = 'error'
+            # Local shortage (descriptors, buffers, ports): the scheduler re-queues these
+            if e.errno in LOCAL_RESOURCE_ERRNOS:
+                result['errno'] = e.errno
             
     except Exception as e:
         # Handle any unexpected errors
@@ -66,11 +92,40 @@ def tcp_scan_port(ip: str, port: int, timeout: float = 2.0) -> Dict[str, any]:
     # Calculate response time
     result['response_time'] = round(time.time() - start_time, 3)
     
+    # Table lookup, done after the connect so it never delays the probe
+    result['service'] = identify_service(port)
+    
+    return result
+
+
+def scan_port_adaptive(ip: str, port: int, timeout: float,
+                       timeout_policy: Optional[AdaptiveTimeout] = None) -> Dict[str, any]:
+    """
+    Scan a port, taking the timeout from timeout_policy when one is given.
+    
+    The timeout is chosen when the probe actually starts (not when it is
+    queued), and the result is fed back into the policy's RTT estimate.
+    """
+    if timeout_policy is None:
+        return tcp_scan_port(ip, port, timeout)
+    result = tcp_scan_port(ip, port, timeout_policy.timeout_for(ip))
+    timeout_policy.observe(ip, result)
+    return result
+
+
+async def scan_port_adaptive_async(ip: str, port: int, timeout: float,
+                                   timeout_policy: Optional[AdaptiveTimeout] = None) -> Dict[str, any]:
+    """Async counterpart of scan_port_adaptive."""
+    if timeout_policy is None:
+        return await tcp_scan_port_async(ip, port, timeout)
+    result = await tcp_scan_port_async(ip, port, timeout_policy.timeout_for(ip))
+    timeout_policy.observe(ip, result)
     return result
 
 
 def tcp_scan_ports(ip: str, ports: List[int], timeout: float = 2.0, 
-                   max_threads: int = 100, show_progress: bool = True) -> List[Dict[str, any]]:
+                   max_threads: int = 100, show_progress: bool = True,
+                   timeout_policy: Optional[AdaptiveTimeout] = None) -> List[Dict[str, any]]:
     """
     Scan multiple ports concurrently using threading with enhanced visual feedback.
     
@@ -80,6 +135,8 @@ def tcp_scan_ports(ip: str, ports: List[int], timeout: float = 2.0,
         timeout (float): Connection timeout per port
         max_threads (int): Maximum concurrent threads
         show_progress (bool): Whether to show progress bar
+        timeout_policy (AdaptiveTimeout): Optional RTT-based timeout policy
+            that overrides the fixed timeout
         
     Returns:
         List[Dict]: List of scan results for each port
@@ -98,19 +155,13 @@ def tcp_scan_ports(ip: str, ports: List[int], timeout: float = 2.0,
     with ThreadPoolExecutor(max_workers=max_threads) as executor:
         # Submit all port scans to the thread pool
         future_to_port = {
-            executor.submit(tcp_scan_port, ip, port, timeout): port 
+            executor.submit(scan_port_adaptive, ip, port, timeout, timeout_policy): port 
             for port in ports
         }
         
         # Create progress bar if requested
         if show_progress:
-            progress_bar = tqdm(
-                total=len(ports),
-                desc=f"{Fore.YELLOW}Scanning{Style.RESET_ALL}",
-                unit="ports",
-                ncols=80,
-                bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]"
-            )
+            progress_bar = _new_progress_bar(len(ports))
         
         # Collect results as they complete
         for future in as_completed(future_to_port):
@@ -122,13 +173,7 @@ def tcp_scan_ports(ip: str, ports: List[int], timeout: float = 2.0,
                 # Handle open ports with colored output
                 if result['status'] == 'open':
                     open_ports_found.append(result)
-                    service_name = result['service']
-                    response_time = result['response_time']
-                    
-                    # Print immediate notification for open ports
-                    print(f"{Fore.GREEN}[OPEN]{Style.RESET_ALL} Port {Fore.YELLOW}{port}{Style.RESET_ALL}: "
-                          f"{Fore.CYAN}{service_name}{Style.RESET_ALL} "
-                          f"({response_time:.3f}s)")
+                    _print_open_port(result)
                 
                 # Update progress bar
                 if show_progress:
@@ -156,25 +201,207 @@ def tcp_scan_ports(ip: str, ports: List[int], timeout: float = 2.0,
     # Sort results by port number for organized output
     results.sort(key=lambda x: x['port'])
     
-    # Summary message with colors
+    _print_completion(results)
+    
+    return results
+
+
+def _print_open_port(result: Dict[str, any], host: Optional[str] = None) -> None:
+    """Print an immediate notification for an open port."""
+    where = f"{host}:{result['port']}" if host else f"Port {result['port']}"
+    print(f"{Fore.GREEN}[OPEN]{Style.RESET_ALL} {Fore.YELLOW}{where}{Style.RESET_ALL}: "
+          f"{Fore.CYAN}{result['service']}{Style.RESET_ALL} "
+          f"({result['response_time']:.3f}s)")
+
+
+def _print_completion(results: List[Dict[str, any]]) -> None:
+    """Print the colored one-line summary shown when a scan finishes."""
     open_count = len([r for r in results if r['status'] == 'open'])
     if open_count > 0:
         print(f"\n{Fore.GREEN}[+] Scan completed! Found {open_count} open ports.{Style.RESET_ALL}")
     else:
         print(f"\n{Fore.YELLOW}[+] Scan completed! No open ports found.{Style.RESET_ALL}")
+
+
+def _new_progress_bar(total: Optional[int]) -> "tqdm":
+    """Create the progress bar shared by all scan engines (total may be unknown)."""
+    # Imported here: tqdm is slow to import and unused with --no-progress
+    from tqdm import tqdm
+    return tqdm(
+        total=total,
+        desc=f"{Fore.YELLOW}Scanning{Style.RESET_ALL}",
+        unit="ports",
+        ncols=80,
+        bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]"
+    )
+
+
+class ConsoleReporter:
+    """
+    Console output for the multi-host engines: open ports as they are found
+    and a progress bar.
+
+    Its on_open and on_progress methods are the callbacks taken by
+    scanner.Scanner and the scheduler engines.
+    """
+
+    def __init__(self, show_progress: bool = True):
+        self.progress_bar = _new_progress_bar(None) if show_progress else None
+
+    def on_open(self, host: str, result: Dict[str, any]) -> None:
+        _print_open_port(result, host)
+
+    def on_progress(self, done: int, open_count: int) -> None:
+        if self.progress_bar is not None:
+            self.progress_bar.update(done - self.progress_bar.n)
+            self.progress_bar.set_postfix({'Open': open_count})
+
+    def close(self) -> None:
+        if self.progress_bar is not None:
+            self.progress_bar.close()
+
+
+async def tcp_scan_port_async(ip: str, port: int, timeout: float = 2.0) -> Dict[str, any]:
+    """
+    Scan a single TCP port with a non-blocking connect on the running event loop.
+    
+    Args:
+        ip (str): Target IP address
+        port (int): Port number to scan
+        timeout (float): Connection timeout in seconds
+        
+    Returns:
+        Dict: Scan result with the same keys and statuses as tcp_scan_port
+    """
+    import asyncio
+    start_time = time.time()
+    
+    result = {
+        'port': port,
+        'status': 'unknown',
+        'service': 'UNKNOWN',
+        'response_time': 0.0
+    }
+    
+    sock = None
+    try:
+        sock = _probe_socket(ip)
+        sock.setblocking(False)
+        
+        loop = asyncio.get_running_loop()
+        await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+        
+        result['status'] = 'open'
+        
+    except asyncio.TimeoutError:
+        result['status'] = 'filtered'
+        
+    except ConnectionRefusedError:
+        result['status'] = 'closed'
+        
+    except OSError as e:
+        if e.errno in _UNREACHABLE_ERRNOS:  # No route to host or network
+            result['status'] = 'unreachable'
+        else:
+            result['status'] = 'error'
+            if e.errno in LOCAL_RESOURCE_ERRNOS:
+                result['errno'] = e.errno
+            
+    except Exception:
+        result['status'] = 'error'
+        
+    finally:
+        if sock is not None:
+            sock.close()
+    
+    result['response_time'] = round(time.time() - start_time, 3)
+    result['service'] = identify_service(port)
+    
+    return result
+
+
+async def tcp_scan_ports_async(ip: str, ports: List[int], timeout: float = 2.0,
+                               max_concurrency: int = 500,
+                               show_progress: bool = True,
+                               timeout_policy: Optional[AdaptiveTimeout] = None) -> List[Dict[str, any]]:
+    """
+    Scan multiple ports on a single event loop instead of a thread pool.
+    
+    Args:
+        ip (str): Target IP address
+        ports (List[int]): List of ports to scan
+        timeout (float): Connection timeout per port
+        max_concurrency (int): Maximum number of connects in flight at once
+        show_progress (bool): Whether to show progress bar
+        timeout_policy (AdaptiveTimeout): Optional RTT-based timeout policy
+        
+    Returns:
+        List[Dict]: List of scan results for each port, sorted by port
+        
+    Learning points:
+        - One thread can drive thousands of non-blocking sockets
+        - A semaphore bounds in-flight connects (and open file descriptors)
+        - Tasks are created lazily, so memory does not grow with the port list
+    """
+    import asyncio
+    results = []
+    open_ports_found = []
+    semaphore = asyncio.Semaphore(max_concurrency)
+    pending = set()
+    
+    print(f"{Fore.CYAN}Scanning {len(ports)} ports on {ip} with up to "
+          f"{max_concurrency} concurrent connects...{Style.RESET_ALL}")
+    
+    progress_bar = _new_progress_bar(len(ports)) if show_progress else None
+    
+    def on_done(task: asyncio.Task) -> None:
+        pending.discard(task)
+        semaphore.release()
+        result = task.result()
+        results.append(result)
+        
+        if result['status'] == 'open':
+            open_ports_found.append(result)
+            _print_open_port(result)
+        
+        if progress_bar is not None:
+            progress_bar.update(1)
+            progress_bar.set_postfix({
+                'Open': len(open_ports_found),
+                'Current': result['port']
+            })
+    
+    for port in ports:
+        await semaphore.acquire()
+        task = asyncio.create_task(scan_port_adaptive_async(ip, port, timeout, timeout_policy))
+        pending.add(task)
+        task.add_done_callback(on_done)
+    
+    if pending:
+        await asyncio.wait(set(pending))
+    
+    if progress_bar is not None:
+        progress_bar.close()
+    
+    results.sort(key=lambda x: x['port'])
+    
+    _print_completion(results)
     
     return results
 
 
-def format_scan_results(target: str, results: List[Dict[str, any]], 
-                       scan_time: float) -> str:
+def format_scan_results(target: str, results: Iterable[Dict[str, any]], 
+                       scan_time: float, counts: Optional[Dict[str, int]] = None) -> str:
     """
     Format scan results with colorized output for enhanced readability.
     
     Args:
         target (str): Target hostname or IP
-        results (List[Dict]): Scan results from tcp_scan_ports
+        results (Iterable[Dict]): Scan results from tcp_scan_ports, or the
+            HostResults of a scheduler scan
         scan_time (float): Total scan time in seconds
+        counts (Dict[str, int]): Per-status totals, when results holds only
+            some of the scanned ports (streaming mode)
         
     Returns:
         str: Formatted and colorized results string
@@ -184,10 +411,20 @@ def format_scan_results(target: str, results: List[Dict[str, any]],
         - User-friendly result presentation
         - Performance metrics display
     """
-    # Filter open ports for the summary
-    open_ports = [r for r in results if r['status'] == 'open']
-    closed_ports = [r for r in results if r['status'] == 'closed']
-    filtered_ports = [r for r in results if r['status'] == 'filtered']
+    # Collect open ports and per-status totals in a single pass
+    open_ports = []
+    tally = {}
+    for result in results:
+        status = result['status']
+        tally[status] = tally.get(status, 0) + 1
+        if status == 'open':
+            open_ports.append(result)
+    if counts is None:
+        counts = tally
+    
+    total_ports = sum(counts.values())
+    closed_count = counts.get('closed', 0)
+    filtered_count = counts.get('filtered', 0)
     
     # Build the colorized report
     report_lines = []
@@ -197,7 +434,7 @@ def format_scan_results(target: str, results: List[Dict[str, any]],
     report_lines.append(f"{Fore.CYAN}{Back.BLUE} PortSpy Scan Results {Style.RESET_ALL}")
     report_lines.append(f"{Fore.CYAN}{'=' * 60}{Style.RESET_ALL}")
     report_lines.append(f"{Fore.WHITE}Target: {Fore.YELLOW}{target}{Style.RESET_ALL}")
-    report_lines.append(f"{Fore.WHITE}Scanned {Fore.YELLOW}{len(results)}{Style.RESET_ALL} ports in {Fore.GREEN}{scan_time:.2f}{Style.RESET_ALL} seconds")
+    report_lines.append(f"{Fore.WHITE}Scanned {Fore.YELLOW}{total_ports}{Style.RESET_ALL} ports in {Fore.GREEN}{scan_time:.2f}{Style.RESET_ALL} seconds")
     report_lines.append("")
     
     if open_ports:
@@ -212,21 +449,24 @@ def format_scan_results(target: str, results: List[Dict[str, any]],
             status_str = f"{Fore.GREEN}{result['status'].upper():<10}{Style.RESET_ALL}"
             time_str = f"{Fore.WHITE}{result['response_time']:<8.3f}s{Style.RESET_ALL}"
             
-            report_lines.append(f"{port_str} {service_str} {status_str} {time_str}")
+            line = f"{port_str} {service_str} {status_str} {time_str}"
+            if result.get('banner'):
+                line += f" {Fore.WHITE}{result['banner']}{Style.RESET_ALL}"
+            report_lines.append(line)
     else:
         report_lines.append(f"{Fore.YELLOW}No open ports found.{Style.RESET_ALL}")
     
     # Add summary of other port statuses if in verbose mode
-    if closed_ports or filtered_ports:
+    if closed_count or filtered_count:
         report_lines.append("")
-        if closed_ports:
-            report_lines.append(f"{Fore.RED}Closed ports: {len(closed_ports)}{Style.RESET_ALL}")
-        if filtered_ports:
-            report_lines.append(f"{Fore.YELLOW}Filtered ports: {len(filtered_ports)}{Style.RESET_ALL}")
+        if closed_count:
+            report_lines.append(f"{Fore.RED}Closed ports: {closed_count}{Style.RESET_ALL}")
+        if filtered_count:
+            report_lines.append(f"{Fore.YELLOW}Filtered ports: {filtered_count}{Style.RESET_ALL}")
     
     report_lines.append("")
     report_lines.append(f"{Fore.WHITE}Scan Summary:{Style.RESET_ALL}")
-    report_lines.append(f"  {Fore.WHITE}Total ports scanned: {Fore.YELLOW}{len(results)}{Style.RESET_ALL}")
+    report_lines.append(f"  {Fore.WHITE}Total ports scanned: {Fore.YELLOW}{total_ports}{Style.RESET_ALL}")
     report_lines.append(f"  {Fore.WHITE}Open ports found: {Fore.GREEN}{len(open_ports)}{Style.RESET_ALL}")
     report_lines.append(f"  {Fore.WHITE}Scan time: {Fore.GREEN}{scan_time:.2f}{Style.RESET_ALL} seconds")
     
@@ -236,7 +476,7 @@ def format_scan_results(target: str, results: List[Dict[str, any]],
         report_lines.append(f"  {Fore.WHITE}Average response time (open ports): {Fore.GREEN}{avg_time:.3f}s{Style.RESET_ALL}")
         
         # Ports per second metric
-        ports_per_sec = len(results) / scan_time if scan_time > 0 else 0
+        ports_per_sec = total_ports / scan_time if scan_time > 0 else 0
         report_lines.append(f"  {Fore.WHITE}Scan rate: {Fore.GREEN}{ports_per_sec:.1f}{Style.RESET_ALL} ports/sec")
     
     report_lines.append(f"{Fore.CYAN}{'=' * 60}{Style.RESET_ALL}")